@@ -85,3 +85,202 @@ def compute3(x: int) -> int:
     print(f'Compute3 calling with: {x}')
     return x * 2
 
+
+
+# ------------- Micro-batching -------------
+
+# Some lookups are much cheaper in bulk than one at a time, e.g. fetching keys from a remote store or loading rows
+# with a schema. But callers usually only have a single item in hand.
+# The batched class decorator collects single-item calls coming from many threads (or coroutines) for a short window,
+# or until max_batch_size items are waiting, then calls the decorated bulk function once with the whole batch.
+# Each caller gets a future that resolves with its own result.
+
+# The decorated function takes a list of items and must return a list of results in the same order.
+# Returning an exception instance for an item fails just that caller's future.
+# It can also decorate a method, def get_many(self, keys). Every instance then gets its own batcher (created on first
+# use and stored in the instance __dict__, like functools.cached_property), so items for different instances never
+# end up in the same batch.
+
+import concurrent.futures
+import threading
+import time
+import asyncio
+
+
+class batched:
+    idle_timeout = 1.0  # The flusher thread exits after this many seconds without calls, and restarts on the next one
+
+    def __init__(self, func, max_batch_size=64, max_wait=0.005, executor=None):
+        self.func = func
+        self.name = func.__name__
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # By default the bulk function runs on the flusher thread, one batch at a time.
+        # Pass a ThreadPoolExecutor to let several batches be in flight at once (useful for I/O).
+        self.executor = executor
+
+        self.pending = []
+        self.first_pending_at = None
+        self.condition = threading.Condition()
+        self.flusher = None
+        self.batches = 0
+
+        functools.update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        # One batcher per instance, bound to it. Storing it under our own name means the instance dict
+        # finds it directly next time (we're a non data descriptor), and it goes away with the instance.
+        bound = batched(self.func.__get__(obj, obj_type), self.max_batch_size, self.max_wait, self.executor)
+        obj.__dict__[self.name] = bound
+        return bound
+
+    def submit(self, item):
+        """ Queues the item for the next batch and returns a concurrent.futures.Future for its result """
+        future = concurrent.futures.Future()
+
+        with self.condition:
+            if self.flusher is None:
+                # Start the flusher lazily, so merely decorating a function doesn't spawn a thread
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+
+            if not self.pending:
+                self.first_pending_at = time.monotonic()
+            self.pending.append((item, future))
+
+            # Wake the flusher when the first item arrives (to start the window) or the batch is full
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch_size:
+                self.condition.notify()
+
+        return future
+
+    def __call__(self, item):
+        """ Blocks the calling thread until the batch containing the item has been processed """
+        return self.submit(item).result()
+
+    async def call_async(self, item):
+        """ Awaits the result without blocking the event loop """
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _flush_loop(self):
+        try:
+            self._flush_batches()
+        finally:
+            # If we died on an unexpected error, let the next submit (or the items already waiting) start a new flusher
+            with self.condition:
+                if self.flusher is threading.current_thread():
+                    self.flusher = None
+                    if self.pending:
+                        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                        self.flusher.start()
+
+    def _flush_batches(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    if not self.condition.wait(self.idle_timeout) and not self.pending:
+                        # Don't keep a thread (and whatever the function is bound to) alive forever
+                        self.flusher = None
+                        return
+
+                # Wait out the rest of the window unless the batch fills up first
+                deadline = self.first_pending_at + self.max_wait
+                while len(self.pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+
+                batch = self.pending[:self.max_batch_size]
+                self.pending = self.pending[self.max_batch_size:]
+                if self.pending:
+                    self.first_pending_at = time.monotonic()
+
+            # Skip items whose caller gave up (e.g. asyncio.wait_for timed out on call_async, which cancels the future).
+            # The ones left are marked running, so they can't be cancelled anymore while we set their results.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self.condition:
+                self.batches += 1
+
+            if self.executor is not None:
+                try:
+                    self.executor.submit(self._dispatch, batch)
+                except Exception as e:
+                    # E.g. the executor was shut down. Fail this batch, but keep the flusher going for the next ones
+                    for _, future in batch:
+                        future.set_exception(e)
+            else:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        futures = [future for _, future in batch]
+
+        try:
+            results = self.func([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f'{self.func.__name__} returned {len(results)} results for {len(batch)} items')
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise  # E.g. SystemExit, the flusher stops but the callers still get an answer
+            return
+
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def __repr__(self):
+        return repr(self.func)
+
+
+# Decorator factory version, so we can pass the batching options
+def micro_batched(max_batch_size=64, max_wait=0.005, executor=None):
+    def micro_batched_decorator(func):
+        return batched(func, max_batch_size, max_wait, executor)
+
+    return micro_batched_decorator
+
+
+# Pretend each get_many call is a round trip to a remote key/value store
+store = {f'key-{i}': i for i in range(100)}
+
+
+@micro_batched(max_batch_size=25, max_wait=0.01)
+def get_many(keys):
+    time.sleep(0.01)  # One round trip for the whole batch
+    return [store.get(key) for key in keys]
+
+
+# 100 threads each asking for a single key end up sharing a handful of bulk calls
+with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
+    values = list(executor.map(get_many, store))
+
+print(f'{len(values)} lookups in {get_many.batches} bulk calls')
+
+
+# Methods get batched per instance
+class RemoteStore:
+    def __init__(self, data):
+        self.data = data
+
+    @micro_batched(max_batch_size=25, max_wait=0.01)
+    def get(self, keys):
+        time.sleep(0.01)
+        return [self.data.get(key) for key in keys]
+
+
+remote = RemoteStore(store)
+with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
+    values = list(executor.map(remote.get, store))
+
+print(f'{len(values)} lookups in {remote.get.batches} bulk calls')
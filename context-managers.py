@@ -26,20 +26,553 @@ finally:
 # This is how we implement our own context manager, we implement the enter and exit dunder methods
 # Lets create our own context manager that creates a db table for setup and drops it for teardown
 
+import itertools
+
+
 class temptable:
-    def __init__(self, cur):
+    def __init__(self, cur, in_memory=False, indexes=()):
         self.cur = cur
+        self.in_memory = in_memory
+        self.indexes = indexes  # Column lists, e.g. ('x', 'x, y'), indexed after the rows are loaded
 
     def __enter__(self):
-        self.cur.execute('create table points(x int, y int)')
+        if self.in_memory:
+            # Temp tables live in a separate temp database, which this keeps in memory instead of in a file on disk
+            self.cur.execute('PRAGMA temp_store = MEMORY')
+            self.cur.execute('create temp table points(x int, y int)')
+        else:
+            self.cur.execute('create table points(x int, y int)')
+        return self
 
-    def __exit(self, *args):
+    def __exit__(self, *args):
         self.cur.execute('drop table points')
 
+    def load(self, rows, batch_size=10_000):
+        """ Streams (x, y) rows from any iterable into the table, returns the number of rows loaded """
+        # Row by row, every insert is a trip through the sqlite3 module and (outside a transaction) its own commit.
+        # executemany runs one prepared insert over a whole batch, and one transaction per batch means one commit
+        # per batch. Batching keeps memory bounded: only batch_size rows of the generator are in memory at a time.
+        # Each batch is a SAVEPOINT rather than BEGIN/COMMIT: on its own a savepoint is a transaction that RELEASE
+        # commits, but when the caller already has a transaction open it nests inside it, so the load never commits
+        # (or rolls back) anything the caller had pending. Their COMMIT or ROLLBACK then covers the loaded rows too.
+        rows = iter(rows)
+        loaded = 0
+        while batch := list(itertools.islice(rows, batch_size)):
+            self.cur.execute('SAVEPOINT temptable_load')
+            try:
+                self.cur.executemany('insert into points(x, y) values (?, ?)', batch)
+            except BaseException:
+                self.cur.execute('ROLLBACK TO temptable_load')
+                self.cur.execute('RELEASE temptable_load')
+                raise
+            self.cur.execute('RELEASE temptable_load')
+            loaded += len(batch)
+
+        # Building an index once over all the rows is much faster than updating it on every insert,
+        # so indexes are only created after the load. (A second load then has to update them as it goes.)
+        for i, columns in enumerate(self.indexes):
+            self.cur.execute(f'create index if not exists points_idx_{i} on points({columns})')
+        return loaded
+
 
 with connect('test.db') as conn:
     cur = conn.cursor()
     with temptable(cur):
         pass
     # The context manager will create our temp table and drop it when its done
-    # Execute some SQL
\ No newline at end of file
+    # Execute some SQL
+
+
+# Bulk loading
+# Inserting a lot of rows one execute() at a time is slow, temptable.load() streams them in batches instead
+
+import time
+
+
+def generate_points(n):
+    for i in range(n):
+        yield i, i * 2
+
+
+with connect('test.db') as conn:
+    cur = conn.cursor()
+
+    with temptable(cur):
+        # The naive way: one insert and one commit (so one write to disk) per row
+        started = time.perf_counter()
+        for point in generate_points(5_000):
+            cur.execute('insert into points(x, y) values (?, ?)', point)
+            conn.commit()
+        print(f'Row by row: {5_000 / (time.perf_counter() - started):,.0f} rows/s')
+
+    with temptable(cur, in_memory=True, indexes=('x', 'y')) as points:
+        started = time.perf_counter()
+        points.load(generate_points(1_000_000))
+        print(f'Bulk load: {1_000_000 / (time.perf_counter() - started):,.0f} rows/s')  # Hundreds of times faster
+
+# Connection pooling
+# Opening a connection for every block (like above) means paying for the open, the close, and warming up sqlite's
+# schema cache each time. A request handler doing that thousands of times a second spends most of its time on it.
+
+# ConnectionPool keeps a bounded number of open connections and lends them out with a context manager:
+#   with pool.connection() as conn: ...
+# On exit the transaction is committed (or rolled back if the block raised) and the connection goes back to the pool.
+# - PRAGMA setup (WAL journal, synchronous, cache and mmap size) runs once, when a connection is created
+# - A thread gets the connection it used last time if it's free (thread affinity), which keeps that connection's
+#   caches warm for the thread, e.g. for the worker threads of a ThreadPoolExecutor
+# - A connection that's been idle for a while is checked with a cheap query before being handed out,
+#   and replaced if it's broken
+# - When all connections are in use, callers wait (up to timeout). pool.metrics() reports how often and how long.
+
+import sqlite3
+import threading
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers don't block the writer and vice versa
+    'synchronous': 'NORMAL',  # Safe with WAL, and far fewer fsyncs than FULL
+    'cache_size': -64_000,  # Negative means KiB, so ~64MB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+class PoolTimeout(Exception):
+    """ Raised when no connection became free within the pool's timeout """
+
+
+class PoolClosed(Exception):
+    """ Raised when asking a closed pool for a connection """
+
+
+class ConnectionPool:
+    def __init__(self, database, max_size=5, timeout=5.0, pragmas=None, health_check_after=30.0):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.health_check_after = health_check_after
+
+        self.idle = {}  # connection -> time it was returned to the pool
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.local = threading.local()
+
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.replaced = 0
+
+    def _connect(self):
+        # Connections move between threads when thread affinity can't be honoured, we make sure only one uses it at a time
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        started = time.perf_counter()
+        waited = False
+
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise PoolClosed(f'The pool for {self.database!r} is closed')
+                preferred = getattr(self.local, 'conn', None)
+                if preferred in self.idle:
+                    conn = preferred
+                    break
+                if self.idle:
+                    conn = next(iter(self.idle))
+                    break
+                if self.size < self.max_size:
+                    conn = None
+                    self.size += 1  # Reserve the slot, then connect outside the lock
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'No connection to {self.database!r} became free within {self.timeout}s')
+                self.condition.wait(remaining)
+
+            idle_since = self.idle.pop(conn, None) if conn is not None else None
+            self.acquired += 1
+            if waited:
+                wait = time.perf_counter() - started
+                self.waits += 1
+                self.wait_time += wait
+                self.max_wait_time = max(self.max_wait_time, wait)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - idle_since > self.health_check_after and not self._healthy(conn):
+                conn.close()
+                conn = self._connect()
+                self.replaced += 1
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        self.local.conn = conn
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # Never hand out a connection with someone else's half done transaction
+            reusable = not self.closed
+        except sqlite3.Error:
+            reusable = False  # E.g. it was closed inside the block
+
+        with self.condition:
+            if reusable and not self.closed:
+                self.idle[conn] = time.monotonic()
+            else:
+                conn.close()
+                self.size -= 1  # Frees the slot, a new connection is made when it's needed
+            self.condition.notify()
+
+    def connection(self):
+        return PooledConnection(self)
+
+    def metrics(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'avg_wait_ms': self.wait_time / self.waits * 1000 if self.waits else 0.0,
+                'max_wait_ms': self.max_wait_time * 1000,
+                'timeouts': self.timeouts,
+                'replaced': self.replaced,
+            }
+
+    def close(self):
+        """ Closes the idle connections, connections that are lent out are closed when they're returned """
+        with self.condition:
+            self.closed = True
+            for conn in self.idle:
+                conn.close()
+            self.size -= len(self.idle)
+            self.idle.clear()
+            self.condition.notify_all()  # Waiting callers get an error instead of waiting for the timeout
+
+
+class PooledConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire()
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.pool.release(self.conn)
+            self.conn = None
+
+
+import concurrent.futures
+
+pool = ConnectionPool('test.db', max_size=4)
+
+
+def count_tables(_):
+    with pool.connection() as conn:
+        return conn.execute('select count(*) from sqlite_master').fetchone()[0]
+
+
+with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+    list(executor.map(count_tables, range(1000)))
+
+print(pool.metrics())  # 8 threads sharing 4 connections, so some of them had to wait
+
+
+# Statement and result caching
+# Read mostly lookup tables tend to be queried with the same handful of statements over and over.
+# CachedCursor wraps a cursor and avoids redoing work for those:
+# - Statements: sqlite has to compile SQL text into a prepared statement before running it. The sqlite3 module keeps
+#   an LRU of those per connection (cached_statements), CachedCursor sizes it to match its own LRU of statements,
+#   which stores what we work out about a statement once (is it a write, which tables does it touch) and its timings.
+# - Results (optional): fetchall() is a read-through cache keyed by the SQL text and the parameters.
+#   A write through the wrapper drops the cached results of the tables it writes to, and a rollback drops the
+#   results of the tables written since the last commit. When the tables of a write can't be worked out from its SQL,
+#   all cached results are dropped, and reads whose tables can't be worked out aren't cached at all.
+#   Only what's written through the wrapper is seen. Writes by other connections, triggers and cascades aren't, and
+#   neither are the tables underneath a view (reading a view caches it under the view's name). So only cache results
+#   of tables (not views) that are only changed through the wrapper.
+# - Stats: stats() lists the statements with their call counts and timings, slowest first.
+
+import collections
+import re
+
+WRITE_KEYWORDS = re.compile(r'\b(?:insert|update|delete|replace)\b', re.I)
+
+# Strings, quoted identifiers and comments are single tokens, so keywords inside them aren't mistaken for SQL
+SQL_TOKENS = re.compile(
+    r"""\s+|--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|\w+|\S""", re.S
+)
+TABLE_KEYWORDS = {'from', 'join', 'into', 'update', 'table', 'view'}
+# Clauses that end the list of tables after a FROM
+END_OF_FROM = {
+    'where', 'group', 'order', 'limit', 'having', 'window', 'union', 'except', 'intersect', 'returning', 'set',
+    'select', 'values',
+}
+
+
+def _identifier(token):
+    if token[0] in '"`':
+        return token[1:-1].replace(token[0] * 2, token[0]).lower()
+    if token[0] == '[':
+        return token[1:-1].lower()
+    if token[0].isalpha() or token[0] == '_':
+        return token.lower()
+    return None
+
+
+def referenced_tables(sql):
+    """ The names of the tables (and views) a statement reads or writes, or None when we can't tell for sure """
+    tokens = [
+        token for token in SQL_TOKENS.findall(sql) if not token.isspace() and not token.startswith(('--', '/*'))
+    ]
+    tables = set()
+    depth = 0
+    in_from = set()  # Paren depths at which we're in the list of tables after a FROM
+    expect_table = False
+    context = None  # The keyword (or comma) the expected table name follows
+    i = 0
+
+    while i < len(tokens):
+        token = tokens[i]
+        word = token.lower()
+        following = tokens[i + 1].lower() if i + 1 < len(tokens) else ''
+
+        if expect_table:
+            expect_table = False
+            if word in ('if', 'not', 'exists') or (word == 'or' and context == 'update'):
+                # IF NOT EXISTS, UPDATE OR IGNORE etc.
+                expect_table = True
+                i += 1 + (word == 'or')
+                continue
+            if word == '(':
+                # Either a subquery, whose own FROM is found as we go, or a parenthesized join
+                depth += 1
+                if following not in ('select', 'with', 'values'):
+                    in_from.add(depth)
+                    expect_table = True
+                i += 1
+                continue
+
+            name = _identifier(token)
+            if name is None:
+                return None
+            while following == '.' and i + 2 < len(tokens):
+                # schema.table, the table is the last part
+                name = _identifier(tokens[i + 2])
+                if name is None:
+                    return None
+                i += 2
+                following = tokens[i + 1].lower() if i + 1 < len(tokens) else ''
+            if not (following == '(' and context in ('from', 'join', ',')):
+                tables.add(name)  # In a FROM, name(...) is a table valued function like json_each()
+            i += 1
+            continue
+
+        if word == '(':
+            depth += 1
+        elif word == ')':
+            in_from.discard(depth)
+            depth -= 1
+        elif word == ',' and depth in in_from:
+            expect_table = True
+            context = ','
+        elif word in TABLE_KEYWORDS:
+            previous = tokens[i - 1].lower() if i else ''
+            # Not the UPDATE in ON CONFLICT DO UPDATE, ON UPDATE CASCADE or a trigger's UPDATE OF
+            if not (word == 'update' and (previous in ('do', 'on') or following == 'of')):
+                expect_table = True
+                context = word
+                if word in ('from', 'join'):
+                    in_from.add(depth)
+        elif word in END_OF_FROM:
+            in_from.discard(depth)
+        i += 1
+
+    if expect_table:
+        return None  # The statement ended where a table name should have been
+    return frozenset(tables)
+
+
+class Statement:
+    def __init__(self, sql):
+        self.sql = sql
+        keyword = sql.lstrip().split(None, 1)[0].lower()
+        self.is_write = keyword not in ('select', 'with', 'explain', 'values') or bool(
+            keyword == 'with' and WRITE_KEYWORDS.search(sql)
+        )
+        self.tables = referenced_tables(sql)
+        self.calls = 0
+        self.cache_hits = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+class CachedCursor:
+    def __init__(self, database, statement_cache_size=128, result_cache_size=0):
+        if isinstance(database, sqlite3.Connection):
+            self.conn = database  # Its own statement cache size was fixed when it was opened
+        else:
+            self.conn = sqlite3.connect(database, cached_statements=statement_cache_size)
+        self.cur = self.conn.cursor()
+        self.statement_cache_size = statement_cache_size
+        self.result_cache_size = result_cache_size
+
+        self.statements = collections.OrderedDict()  # sql -> Statement, least recently used first
+        self.results = collections.OrderedDict()  # (sql, params) -> (rows, tables), least recently used first
+        self.results_by_table = collections.defaultdict(set)  # table -> keys of the cached results reading it
+        self.written_tables = set()  # Tables written to since the last commit
+        self.invalidations = 0
+
+    def statement(self, sql):
+        statement = self.statements.get(sql)
+        if statement is None:
+            statement = self.statements[sql] = Statement(sql)
+            if len(self.statements) > self.statement_cache_size:
+                self.statements.popitem(last=False)
+        else:
+            self.statements.move_to_end(sql)
+        return statement
+
+    def _run(self, statement, method, params):
+        started = time.perf_counter()
+        try:
+            return method(statement.sql, params)
+        finally:
+            statement.record(time.perf_counter() - started)
+            if statement.is_write:
+                # When we couldn't tell which tables it writes to, assume it could be any of them
+                self.invalidate(statement.tables or None)
+                self.written_tables |= statement.tables or {None}
+
+    def execute(self, sql, params=()):
+        self._run(self.statement(sql), self.cur.execute, params)
+        return self.cur
+
+    def executemany(self, sql, seq_of_params):
+        self._run(self.statement(sql), self.cur.executemany, seq_of_params)
+        return self.cur
+
+    def fetchall(self, sql, params=()):
+        statement = self.statement(sql)
+        if statement.is_write or statement.tables is None or not self.result_cache_size:
+            return self._run(statement, self.cur.execute, params).fetchall()
+
+        key = sql, tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params)
+        cached = self.results.get(key)
+        if cached is not None:
+            self.results.move_to_end(key)
+            statement.cache_hits += 1
+            return list(cached[0])
+
+        rows = tuple(self._run(statement, self.cur.execute, params).fetchall())
+        self.results[key] = rows, statement.tables
+        for table in statement.tables:
+            self.results_by_table[table].add(key)
+        if len(self.results) > self.result_cache_size:
+            self._forget(next(iter(self.results)))
+        return list(rows)
+
+    def _forget(self, key):
+        _, tables = self.results.pop(key)
+        for table in tables:
+            self.results_by_table[table].discard(key)
+
+    def invalidate(self, tables=None):
+        """ Drops the cached results reading any of the tables, or all of them when tables is None (or contains None) """
+        if tables is None or None in tables:
+            self.invalidations += len(self.results)
+            self.results.clear()
+            self.results_by_table.clear()
+            return
+        for table in tables:
+            for key in self.results_by_table.pop(table, ()):
+                if key in self.results:
+                    self._forget(key)
+                    self.invalidations += 1
+
+    def commit(self):
+        self.conn.commit()
+        self.written_tables.clear()
+
+    def rollback(self):
+        self.conn.rollback()
+        # Results read after those writes came from data that doesn't exist anymore
+        if self.written_tables:
+            self.invalidate(self.written_tables)
+        self.written_tables.clear()
+
+    def stats(self):
+        return sorted(
+            (
+                {
+                    'sql': statement.sql,
+                    'calls': statement.calls,
+                    'cache_hits': statement.cache_hits,
+                    'total_ms': statement.total_time * 1000,
+                    'avg_ms': statement.total_time / statement.calls * 1000 if statement.calls else 0.0,
+                    'max_ms': statement.max_time * 1000,
+                }
+                for statement in self.statements.values()
+            ),
+            key=lambda stats: stats['total_ms'],
+            reverse=True,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Just like a connection: commit if the block succeeded, roll back if it raised
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+with CachedCursor(':memory:', result_cache_size=1000) as db:
+    db.execute('create table countries(code text primary key, name text)')
+    db.executemany('insert into countries values (?, ?)', [('nl', 'Netherlands'), ('be', 'Belgium'), ('de', 'Germany')])
+
+    for _ in range(10_000):
+        db.fetchall('select name from countries where code = ?', ('nl',))  # Only the first one runs the query
+
+    db.execute('update countries set name = ? where code = ?', ('The Netherlands', 'nl'))  # Drops the cached results
+    print(db.fetchall('select name from countries where code = ?', ('nl',)))  # [('The Netherlands',)]
+
+    for stats in db.stats():
+        print(stats)
@@ -0,0 +1,582 @@
+# Fast CSV readers
+# generators.py shows how csv_reader_generator yields a file one row at a time. That's the right idea for big files,
+# but one generator resume per line is slow, and it only ever uses one core.
+# The readers here are built on the same idea, for when the files get really big:
+# - csv_batch_reader: parses big blocks at once and yields batches of rows
+# - parallel_csv_reader: parses byte ranges of the file on every core
+# - MappedCSV: random access to any row through a memory mapped file and a saved index
+# - async_csv_batch_reader / async_csv_reader: reading from asyncio code without blocking the event loop
+# - FileFollower: "tail -f" for files that keep growing
+# They live in their own module (generators.py runs its examples, including an infinite loop, when imported),
+# so they can be imported, and so the process pool workers of parallel_csv_reader can import them.
+
+# ------------- Reading a CSV file in batches -------------
+
+# Yielding one raw line at a time means one generator resume per line, which adds up on files with millions of rows.
+# csv_batch_reader reads big blocks instead, parses every complete row in the block with the csv module in one go,
+# and yields the parsed rows in batches.
+
+# A row can be cut in half at the end of a block, so the incomplete tail is carried over to the next block.
+# A newline inside a quoted field isn't the end of a row: a newline ends a row only if an even number of quotes come
+# before it (escaped quotes are doubled, so they don't change that).
+
+import csv
+import io
+
+
+def _last_row_end(buffer):
+    """ Returns the index just after the last newline that ends a row, or 0 if there is none. Works on str and bytes """
+    quote, newline_char = (b'"', b'\n') if isinstance(buffer, bytes) else ('"', '\n')
+    quotes = buffer.count(quote)
+    end = len(buffer)
+    while True:
+        newline = buffer.rfind(newline_char, 0, end)
+        if newline == -1:
+            return 0
+        if not quotes or (quotes - buffer.count(quote, newline)) % 2 == 0:
+            return newline + 1
+        end = newline
+
+
+def _parse_rows(text):
+    return list(csv.reader(io.StringIO(text, newline='')))
+
+
+def _split_block(leftover, block):
+    """ Returns (complete rows text, leftover for the next block). An empty block means we're at the end of the file """
+    buffer = leftover + block
+    if not block:
+        # End of the file, whatever is left is the last row (it just didn't end with a newline)
+        return buffer, ''
+    end = _last_row_end(buffer)
+    return buffer[:end], buffer[end:]
+
+
+def csv_batch_reader(file_name, batch_size=10_000, block_size=1 << 20, columns=False, header=False, encoding='utf-8'):
+    """ Yields lists of up to batch_size parsed rows
+
+    columns=True yields each batch as columns instead: a tuple of values per column,
+    or a dict of column name -> values when header=True.
+    """
+    pending = []
+    names = None
+
+    def output(rows):
+        if not columns:
+            return rows
+        cols = list(zip(*rows))
+        return dict(zip(names, cols)) if names is not None else cols
+
+    with open(file_name, 'r', newline='', encoding=encoding) as file:
+        leftover = ''
+        while True:
+            block = file.read(block_size)
+            complete, leftover = _split_block(leftover, block)
+
+            if complete:
+                rows = _parse_rows(complete)
+                if header and names is None and rows:
+                    names = rows.pop(0)
+                pending.extend(rows)
+
+                while len(pending) >= batch_size:
+                    yield output(pending[:batch_size])
+                    del pending[:batch_size]
+
+            if not block:
+                break
+
+    if pending:
+        yield output(pending)
+
+
+# ------------- Parsing a CSV file on every core -------------
+
+# csv_batch_reader still parses on a single core. To use all of them, we split the file into byte ranges,
+# and parse each range in a ProcessPoolExecutor worker (see multi-processing.py).
+
+# Ranges have to start at the beginning of a row. We can't just look for the next newline after the split point,
+# since it could be inside a quoted field, so we count the quotes before it: bytes.count is fast enough to do that
+# for the whole file, and it's far cheaper than parsing.
+
+# Sending millions of small strings back from a worker means pickling (and unpickling) each one.
+# Instead a worker packs its rows into one string, fields separated by \x1f and rows by \x1e (the ASCII unit and record
+# separators), which the parent splits apart again with str.split.
+
+import concurrent.futures
+import collections
+import os
+
+FIELD_SEPARATOR = '\x1f'
+ROW_SEPARATOR = '\x1e'
+
+
+def _row_aligned_ranges(file_name, chunk_bytes, read_size=1 << 24):
+    """ Splits the file into (start, end) byte ranges of roughly chunk_bytes that each start at the beginning of a row """
+    size = os.path.getsize(file_name)
+    bounds = [0]
+
+    with open(file_name, 'rb') as file:
+        quotes = 0  # Number of quotes before pos
+        pos = 0
+
+        while bounds[-1] + chunk_bytes < size:
+            target = bounds[-1] + chunk_bytes
+
+            # Count the quotes up to the split point
+            while pos < target:
+                data = file.read(min(read_size, target - pos))
+                quotes += data.count(b'"')
+                pos += len(data)
+
+            # Then look for the first newline after it that's outside quotes
+            boundary = None
+            while boundary is None and pos < size:
+                data = file.read(read_size)
+                newline = data.find(b'\n')
+                while newline != -1:
+                    if (quotes + data.count(b'"', 0, newline)) % 2 == 0:
+                        boundary = pos + newline + 1
+                        break
+                    newline = data.find(b'\n', newline + 1)
+
+                if boundary is None:
+                    quotes += data.count(b'"')
+                    pos += len(data)
+                else:
+                    # Rewind to the boundary, so the quote count stays in step with pos
+                    quotes += data.count(b'"', 0, newline + 1)
+                    pos = boundary
+                    file.seek(pos)
+
+            if boundary is None or boundary >= size:
+                break
+            bounds.append(boundary)
+
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _parse_byte_range(file_name, start, end, encoding, skip_header, transform):
+    """ Runs in a worker process: parses the rows between start and end """
+    with open(file_name, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode(encoding)
+
+    rows = _parse_rows(text)
+    if skip_header and rows:
+        rows.pop(0)
+
+    if transform is not None:
+        return 'rows', [transform(row) for row in rows]
+
+    # Data containing the separators (or blank lines, which csv parses as empty rows) can't be packed unambiguously,
+    # fall back to pickling the list
+    if FIELD_SEPARATOR in text or ROW_SEPARATOR in text or not all(rows):
+        return 'rows', rows
+    return 'packed', ROW_SEPARATOR.join(FIELD_SEPARATOR.join(row) for row in rows)
+
+
+def _unpack_rows(result):
+    kind, payload = result
+    if kind == 'rows':
+        return payload
+    if not payload:
+        return []
+    return [row.split(FIELD_SEPARATOR) for row in payload.split(ROW_SEPARATOR)]
+
+
+def parallel_csv_reader(file_name, workers=None, chunk_bytes=32 << 20, ordered=True, header=False,
+                        encoding='utf-8', transform=None):
+    """ Yields a list of parsed rows per byte range of the file, parsed across a pool of worker processes
+
+    ordered=False yields each range as soon as it's parsed, instead of in file order.
+    transform is applied to every row in the worker (it has to be picklable, e.g. a module level function).
+    """
+    ranges = _row_aligned_ranges(file_name, chunk_bytes)
+    workers = workers or os.cpu_count()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only keep a few ranges in flight per worker, so parsed rows don't pile up in memory faster than we consume them
+        max_in_flight = 2 * workers
+        pending = collections.deque()
+        ranges_iter = iter(enumerate(ranges))
+
+        def submit_next():
+            for index, (start, end) in ranges_iter:
+                pending.append(executor.submit(
+                    _parse_byte_range, file_name, start, end, encoding, header and index == 0, transform
+                ))
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+
+            submit_next()
+            yield _unpack_rows(future.result())
+
+# e.g.
+# if __name__ == '__main__':
+#     for rows in parallel_csv_reader('data.csv', header=True, ordered=False):
+#         ...
+
+
+# ------------- Random access into a big CSV file -------------
+
+# Generators are great for reading a file front to back, but jumping to row N means reading every row before it.
+# MappedCSV instead memory maps the file and builds an index of where every row starts, in one pass.
+# The index is an array('Q') (8 bytes per row, not a python int object per row), and is saved next to the file
+# in a sidecar .idx file, so it's only rebuilt when the file changes.
+
+# rows[i] and rows[i:j] then return memoryviews straight into the mapped file: no reading, no copying.
+# Python only loads the pages of the file we actually touch.
+
+import mmap
+import re
+import struct
+from array import array
+
+INDEX_HEADER = struct.Struct('<8sQQQ')  # magic, file size, mtime in ns, inode
+INDEX_MAGIC = b'CSVIDX1\0'
+
+
+class MappedCSV:
+    def __init__(self, file_name, sidecar=True):
+        self.file_name = file_name
+        self.index_name = file_name + '.idx' if sidecar else None
+        self.file = open(file_name, 'rb')
+        stat = os.fstat(self.file.fileno())
+        self.stamp = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+        # An empty file can't be memory mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        self.view = memoryview(self.data)
+
+        self.offsets = self._load_index()
+        if self.offsets is None:
+            self.offsets = self._build_index()
+            self._save_index()
+
+    def _build_index(self, block_size=1 << 24):
+        """ Offsets of the start of every row, plus the end of the file, skipping newlines inside quoted fields """
+        offsets = array('Q', [0])
+        size = len(self.data)
+        quotes = 0  # Quotes seen since the start of the current row
+        newline = re.compile(b'\n')
+
+        for block_start in range(0, size, block_size):
+            block = self.data[block_start:block_start + block_size]
+
+            if quotes % 2 == 0 and b'"' not in block:
+                # Fast path: no quotes anywhere, every newline ends a row
+                offsets.extend(block_start + m.end() for m in newline.finditer(block))
+                continue
+
+            prev = 0
+            for m in newline.finditer(block):
+                quotes += block.count(b'"', prev, m.start())
+                prev = m.end()
+                if quotes % 2 == 0:
+                    offsets.append(block_start + prev)
+                    quotes = 0
+            quotes += block.count(b'"', prev)
+
+        if offsets[-1] != size:
+            offsets.append(size)  # The last row didn't end with a newline
+        return offsets
+
+    def _load_index(self):
+        if self.index_name is None or not os.path.exists(self.index_name):
+            return None
+
+        with open(self.index_name, 'rb') as file:
+            magic, *stamp = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC or tuple(stamp) != self.stamp:
+                return None  # Stale index, the file has changed since
+            offsets = array('Q')
+            offsets.frombytes(file.read())
+            return offsets
+
+    def _save_index(self):
+        if self.index_name is None:
+            return
+
+        try:
+            # Write to a temp file and rename it into place, so a reader never sees a half written index
+            temp_name = f'{self.index_name}.{os.getpid()}.tmp'
+            with open(temp_name, 'wb') as file:
+                file.write(INDEX_HEADER.pack(INDEX_MAGIC, *self.stamp))
+                self.offsets.tofile(file)
+            os.replace(temp_name, self.index_name)
+        except OSError:
+            pass  # e.g. a read only directory, we just rebuild the index next time
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _row_end(self, end):
+        """ Moves end back before the row's line ending """
+        if end and self.data[end - 1] == 10:  # \n
+            end -= 1
+            if end and self.data[end - 1] == 13:  # \r
+                end -= 1
+        return end
+
+    def __getitem__(self, item):
+        """ rows[i] is the raw bytes of row i without its line ending, rows[i:j] the bytes of rows i to j-1 """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return self.view[0:0]
+            return self.view[self.offsets[start]:self.offsets[stop]]
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('row index out of range')
+        return self.view[self.offsets[item]:self._row_end(self.offsets[item + 1])]
+
+    def parse(self, start, stop=None, encoding='utf-8'):
+        """ Parses rows start to stop-1 (or just row start) with the csv module """
+        stop = start + 1 if stop is None else stop
+        return _parse_rows(str(self[start:stop], encoding))
+
+    def close(self):
+        """ Closes the file. Rows the caller still holds keep the mapping alive until they're released """
+        try:
+            # The mmap can't be closed while memoryviews into it are still alive, so release ours first
+            self.view.release()
+            if isinstance(self.data, mmap.mmap):
+                try:
+                    self.data.close()
+                except BufferError:
+                    # The caller still holds rows (memoryviews) pointing into the mapping. They stay valid,
+                    # and the mapping is unmapped when the last of them is garbage collected.
+                    pass
+        finally:
+            self.data = b''
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# e.g.
+# with MappedCSV('data.csv') as rows:
+#     bytes(rows[1_000_000])  -> b'...'
+#     rows.parse(1_000_000, 1_000_100)  -> 100 parsed rows
+
+
+# ------------- Reading CSV files from asyncio code -------------
+
+# Calling csv_reader_generator from a coroutine blocks the whole event loop every time it reads from disk,
+# so every other task (e.g. the requests an async.py style service is handling) stalls while we wait.
+
+# async_csv_batch_reader is an async generator (async def + yield, consumed with "async for").
+# The blocking file reads run in a worker thread with loop.run_in_executor, and while we parse one block on the loop,
+# the next block is already being read in the background (double buffering).
+
+import asyncio
+import functools
+
+
+async def async_csv_batch_reader(file_name, batch_size=10_000, block_size=1 << 20, encoding='utf-8'):
+    """ Async version of csv_batch_reader: yields lists of up to batch_size parsed rows """
+    loop = asyncio.get_running_loop()
+    file = await loop.run_in_executor(None, functools.partial(open, file_name, 'r', newline='', encoding=encoding))
+    next_block = None
+
+    try:
+        next_block = loop.run_in_executor(None, file.read, block_size)
+        leftover = ''
+        pending = []
+
+        while True:
+            block = await next_block
+            next_block = loop.run_in_executor(None, file.read, block_size) if block else None
+
+            complete, leftover = _split_block(leftover, block)
+            if complete:
+                pending.extend(_parse_rows(complete))
+                while len(pending) >= batch_size:
+                    yield pending[:batch_size]
+                    del pending[:batch_size]
+
+            if not block:
+                break
+
+            # Parsing a block takes a little while, let the other tasks have a turn
+            await asyncio.sleep(0)
+
+        if pending:
+            yield pending
+    finally:
+        # The file can't be closed while a read is still running in the worker thread
+        if next_block is not None:
+            await asyncio.wait([next_block])
+        await loop.run_in_executor(None, file.close)
+
+
+async def async_csv_reader(file_name, **kwargs):
+    """ Yields one parsed row at a time """
+    async for batch in async_csv_batch_reader(file_name, **kwargs):
+        for row in batch:
+            yield row
+
+# e.g. in a coroutine:
+# async for batch in async_csv_batch_reader('upload.csv'):
+#     await save(batch)
+
+
+# ------------- Following a growing file -------------
+
+# Log files and CSV exports that keep getting appended to are usually picked up by re-reading the whole file every so often.
+# FileFollower works like "tail -f": it remembers how far it has read (a byte offset), and only reads what's new.
+# - Only complete rows are handed out, a half written row waits until the rest of it arrives.
+# - If the file gets truncated (it's now shorter than our offset), we start again from the beginning.
+# - If the file gets rotated (renamed away and a new file created with the same name), we finish the old file
+#   and then switch to the new one.
+# - When there's nothing new, we wait a bit longer between polls each time (up to max_interval),
+#   and go back to polling quickly as soon as data arrives.
+
+# checkpoint() returns the position after the last batch handed out. Save it (save_checkpoint) once you've processed
+# a batch, and pass it back in after a restart to carry on where you left off. A crash between processing a batch and
+# saving the checkpoint means that batch gets handed out again, so rows are delivered at least once.
+
+import json
+import time
+
+
+class FileFollower:
+    def __init__(self, file_name, checkpoint=None, parse=True, encoding='utf-8',
+                 min_interval=0.05, max_interval=2.0, read_size=1 << 20):
+        self.file_name = file_name
+        self.parse = parse
+        self.encoding = encoding
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.read_size = read_size
+        self.stopped = False
+
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        if checkpoint is not None:
+            self.inode, self.offset = checkpoint['inode'], checkpoint['offset']
+
+    def checkpoint(self):
+        return {'inode': self.inode, 'offset': self.offset}
+
+    def save_checkpoint(self, path):
+        # Write to a temp file and rename it into place, so a crash mid write can't leave a broken checkpoint behind
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def load_checkpoint(path):
+        """ Returns the saved checkpoint, or None if there isn't one yet """
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def stop(self):
+        """ Makes the generator return at its next poll """
+        self.stopped = True
+
+    def _open(self):
+        """ Opens the file if it exists, resuming from the offset if it's still the file the offset belongs to """
+        try:
+            file = open(self.file_name, 'rb')
+        except FileNotFoundError:
+            return False
+
+        inode = os.fstat(file.fileno()).st_ino
+        if inode != self.inode:
+            self.offset = 0  # A different file than the checkpoint was for
+        self.file, self.inode = file, inode
+        return True
+
+    def _read_new(self):
+        """ Reads up to read_size new bytes (more if a single row is longer than that), returns the complete rows (bytes) """
+        size = os.fstat(self.file.fileno()).st_size
+        if size < self.offset:
+            self.offset = 0  # Truncated
+
+        # Starting on a big existing file, or from an old checkpoint, we don't want the whole backlog in memory at once.
+        # __iter__ comes straight back for the next read_size bytes without sleeping, as long as there's more to read.
+        self.file.seek(self.offset)
+        available = size - self.offset
+        data = b''
+        while len(data) < available:
+            data += self.file.read(min(self.read_size, available - len(data)))
+            # CSV rows can contain quoted newlines. Plain lines (parse=False, e.g. a log file) just end at a newline,
+            # there a stray quote mustn't make us wait for a closing quote that never comes.
+            end = _last_row_end(data) if self.parse else data.rfind(b'\n') + 1
+            if end:
+                return data[:end]
+        return b''
+
+    def _rotated(self):
+        try:
+            return os.stat(self.file_name).st_ino != self.inode
+        except FileNotFoundError:
+            return True  # Renamed away, and the new file isn't there yet
+
+    def _rows(self, data):
+        text = data.decode(self.encoding)
+        if self.parse:
+            return _parse_rows(text)
+        # Not splitlines(), that also splits on a lone \r, \x1e, \u2028 etc. which can be part of a line
+        return [line[:-1] if line.endswith('\r') else line for line in text[:-1].split('\n')]
+
+    def __iter__(self):
+        """ Yields a list of new rows whenever some are appended to the file """
+        interval = self.min_interval
+        try:
+            while not self.stopped:
+                if self.file is None and not self._open():
+                    time.sleep(interval)
+                    interval = min(interval * 2, self.max_interval)
+                    continue
+
+                data = self._read_new()
+                if not data and self._rotated():
+                    # We've read everything the old file had, move on to the new one
+                    self.file.close()
+                    self.file = None
+                    self.inode = None
+                    continue
+
+                if data:
+                    self.offset += len(data)
+                    interval = self.min_interval
+                    yield self._rows(data)
+                else:
+                    time.sleep(interval)
+                    interval = min(interval * 2, self.max_interval)
+        finally:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# e.g.
+# follower = FileFollower('events.csv', checkpoint=FileFollower.load_checkpoint('events.checkpoint'))
+# for rows in follower:
+#     process(rows)
+#     follower.save_checkpoint('events.checkpoint')
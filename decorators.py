@@ -173,25 +173,32 @@ import sys
 logger = logging.getLogger(__name__)
 
 
+def _log_exception(e, err_msg=None, verbosity=False):
+    """ Logs the exception currently being handled, shared by exception_handler and retry """
+    if err_msg is not None:
+        logger.error(err_msg)
+    else:
+        logger.error(e)
+
+    if verbosity is True:
+        type_, value, traceback = sys.exc_info()
+
+        logger.debug(f'Exception Type {type_}')
+        logger.debug(f'Exception Instance: {value}')
+        logger.debug(f'Traceback: {traceback}')
+
+
 def exception_handler(exception, err_msg=None, verbosity=False):
     """ Wraps the decorated function with a try except using the exception arg """
 
     def wrapper(func):
+        @functools.wraps(func)
         def inner(*args, **kwargs):
             try:
-                func(*args, **kwargs)
+                # Return the value, otherwise the decorated function would always return None
+                return func(*args, **kwargs)
             except exception as e:
-                if err_msg is not None:
-                    logger.error(err_msg)
-                else:
-                    logger.error(e)
-
-                if verbosity is True:
-                    type_, value, traceback = sys.exc_info()
-
-                    logger.debug(f'Exception Type {type_}')
-                    logger.debug(f'Exception Instance: {value}')
-                    logger.debug(f'Traceback: {traceback}')
+                _log_exception(e, err_msg, verbosity)
 
         return inner
 
@@ -204,4 +211,458 @@ def add(x, y):
     return z
 
 
-add(5, "5")
\ No newline at end of file
+add(5, "5")
+
+# ------------- Retry With Backoff -------------
+
+# exception_handler swallows the exception, which is fine for a demo but not for transient I/O errors
+# (e.g. download_image in threads.py hitting a flaky server). For those we want to try again a few times.
+
+# Retrying straight away tends to hammer a struggling server, so we wait longer after each failure (exponential backoff)
+# and pick a random delay inside that window (jitter) so a pool of threads doesn't retry in lock step.
+# A deadline caps the total time spent on one call, no matter how many attempts are left.
+
+# If a dependency keeps failing, retrying just ties up our pool threads. A circuit breaker counts consecutive failures
+# per target and, once it trips "open", rejects calls immediately until a cool-down has passed.
+# After the cool-down it goes "half-open" and lets a single trial call through to decide whether to close again.
+
+import asyncio
+import inspect
+import random
+import threading
+
+
+class CircuitOpenError(Exception):
+    """ Raised when a call is rejected because the circuit breaker for its target is open """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ Returns True if a call may go through to the target """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Cool-down is over, let one trial call through
+                self.state = 'half-open'
+                return True
+
+            # Still cooling down, or a trial call is already in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_abandoned(self):
+        """ The call was interrupted (e.g. cancelled or KeyboardInterrupt), so it tells us nothing about the target """
+        with self._lock:
+            if self.state == 'half-open':
+                # Give the trial back: opened_at is more than reset_timeout ago, so the next call becomes the trial
+                self.state = 'open'
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class RetryMetrics:
+    """ Counters shared by every call of a retry decorated function """
+
+    def __init__(self, breakers):
+        self.breakers = breakers
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'breakers': {target: breaker.state for target, breaker in list(self.breakers.items())},
+            }
+
+
+def retry(exception, attempts=3, base_delay=0.1, max_delay=5.0, deadline=None,
+          failure_threshold=5, reset_timeout=30.0, target=None, err_msg=None, verbosity=False):
+    """ Retries the decorated function (or coroutine function) when it raises the exception arg
+
+    target is called with the function's arguments and returns the key of the circuit breaker to use,
+    e.g. target=lambda url: urlparse(url).netloc gives each host its own breaker.
+    By default all calls share a single breaker.
+    """
+    if attempts < 1:
+        raise ValueError(f'Expected attempts to be at least 1, got {attempts!r}')
+
+    def wrapper(func):
+        breakers = {}
+        breakers_lock = threading.Lock()
+        metrics = RetryMetrics(breakers)
+
+        def get_breaker(args, kwargs):
+            key = target(*args, **kwargs) if target is not None else func.__qualname__
+            with breakers_lock:
+                breaker = breakers.get(key)
+                if breaker is None:
+                    breakers[key] = breaker = CircuitBreaker(failure_threshold, reset_timeout)
+            return breaker
+
+        def check_breaker(breaker):
+            if not breaker.allow():
+                metrics.incr('rejected')
+                raise CircuitOpenError(f'Circuit breaker for {func.__qualname__} is open')
+
+        def on_failure(e, breaker, attempt, started):
+            """ Returns how long to sleep before the next attempt, or None if we should give up """
+            breaker.record_failure()
+            _log_exception(e, err_msg, verbosity)
+
+            if breaker.state == 'open':
+                # This failure tripped the breaker, the next attempt would only be rejected. Give up now,
+                # so the caller sees the real error instead of a CircuitOpenError after sleeping for nothing.
+                metrics.incr('failures')
+                return None
+
+            # Full jitter: sleep anywhere between 0 and the exponential backoff window
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            out_of_time = deadline is not None and time.monotonic() - started + delay > deadline
+
+            if attempt >= attempts or out_of_time:
+                metrics.incr('failures')
+                return None
+
+            metrics.incr('retries')
+            return delay
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def inner(*args, **kwargs):
+                breaker = get_breaker(args, kwargs)
+                metrics.incr('calls')
+                started = time.monotonic()
+
+                for attempt in range(1, attempts + 1):
+                    check_breaker(breaker)
+                    try:
+                        value = await func(*args, **kwargs)
+                    except exception as e:
+                        delay = on_failure(e, breaker, attempt, started)
+                        if delay is None:
+                            raise
+                        # asyncio.sleep instead of time.sleep, so we don't block the event loop while backing off
+                        await asyncio.sleep(delay)
+                    except Exception:
+                        # Not a transient error, the target did respond
+                        breaker.record_success()
+                        raise
+                    except BaseException:
+                        # Cancelled while waiting for the target, we don't know how it's doing
+                        breaker.record_abandoned()
+                        raise
+                    else:
+                        breaker.record_success()
+                        return value
+        else:
+            @functools.wraps(func)
+            def inner(*args, **kwargs):
+                breaker = get_breaker(args, kwargs)
+                metrics.incr('calls')
+                started = time.monotonic()
+
+                for attempt in range(1, attempts + 1):
+                    check_breaker(breaker)
+                    try:
+                        value = func(*args, **kwargs)
+                    except exception as e:
+                        delay = on_failure(e, breaker, attempt, started)
+                        if delay is None:
+                            raise
+                        time.sleep(delay)
+                    except Exception:
+                        breaker.record_success()
+                        raise
+                    except BaseException:
+                        breaker.record_abandoned()
+                        raise
+                    else:
+                        breaker.record_success()
+                        return value
+
+        # Expose the metrics and breakers so they can be scraped or inspected, e.g. flaky_fetch.metrics.snapshot()
+        inner.metrics = metrics
+        inner.breakers = breakers
+        return inner
+
+    return wrapper
+
+
+fetch_attempts = 0
+
+
+@retry(ConnectionError, attempts=5, base_delay=0.01, deadline=2.0, target=lambda url: url.split('/')[2])
+def flaky_fetch(url):
+    """ Fails twice before succeeding, like a server that's briefly overloaded """
+    global fetch_attempts
+    fetch_attempts += 1
+    if fetch_attempts < 3:
+        raise ConnectionError(f'Could not reach {url}')
+    return f'Fetched {url}'
+
+
+flaky_fetch('https://images.unsplash.com/photo-1516117172878-fd2c41f4a759')
+
+# {'calls': 1, 'retries': 2, 'failures': 0, 'rejected': 0, 'breakers': {'images.unsplash.com': 'closed'}}
+print(flaky_fetch.metrics.snapshot())
+
+
+# The async variant is picked automatically when decorating a coroutine function
+@retry(ConnectionError, attempts=3, base_delay=0.01)
+async def async_fetch(url):
+    await asyncio.sleep(0)
+    return f'Fetched {url}'
+
+
+asyncio.run(async_fetch('https://images.unsplash.com/photo-1532009324734-20a7a5813719'))
+
+
+# ------------- Fusing Decorator Stacks -------------
+
+# Every decorator in a stack like @debug @exception_handler(...) @cached adds its own wrapper function,
+# so one call to the decorated function costs one extra Python frame and one *args/**kwargs repack per layer.
+# That overhead adds up on hot functions that carry 4-6 decorators.
+
+# Instead of each layer wrapping the next, each layer can just declare hooks:
+#   before(args, kwargs)         -> runs before the call, return a value to short-circuit it (e.g. a cache hit)
+#   after(args, kwargs, value)   -> runs after a successful call, returns the (possibly changed) value
+#   error(args, kwargs, e)       -> runs when the call raises, re-raise or return a fallback value
+# fuse() then generates ONE wrapper function for the whole stack, with the same signature as the decorated function.
+# Only the hooks a layer actually overrides end up in the generated code.
+
+# Args are passed to hooks the way they bind to the signature: positional params in args, keyword-only ones in kwargs.
+
+
+class Layer:
+    def before(self, args, kwargs):
+        return NOT_SET
+
+    def after(self, args, kwargs, value):
+        return value
+
+    def error(self, args, kwargs, e):
+        raise e
+
+    def __call__(self, func):
+        # A single layer can be used as a regular decorator too
+        return fuse(self)(func)
+
+
+# Sentinel returned by before() when the call should go ahead
+NOT_SET = object()
+
+
+class DebugLayer(Layer):
+    """ The @debug decorator as a layer """
+
+    def __init__(self, name):
+        self.name = name
+
+    def before(self, args, kwargs):
+        signature = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+        print(f"Calling {self.name}({signature})")
+        return NOT_SET
+
+    def after(self, args, kwargs, value):
+        print(f"{self.name!r} returned {value!r}")
+        return value
+
+
+class ExceptionLayer(Layer):
+    """ The @exception_handler decorator as a layer """
+
+    def __init__(self, exception, err_msg=None, verbosity=False):
+        self.exception = exception
+        self.err_msg = err_msg
+        self.verbosity = verbosity
+
+    def error(self, args, kwargs, e):
+        if not isinstance(e, self.exception):
+            raise e
+        _log_exception(e, self.err_msg, self.verbosity)
+
+
+class CacheLayer(Layer):
+    """ Caches return values by arguments, like the cached decorators in class-decorators.py """
+
+    def __init__(self):
+        self.cached_data = {}
+
+    def before(self, args, kwargs):
+        return self.cached_data.get((args, tuple(kwargs.items())), NOT_SET)
+
+    def after(self, args, kwargs, value):
+        self.cached_data[(args, tuple(kwargs.items()))] = value
+        return value
+
+
+class CountCallsLayer(Layer):
+    def __init__(self):
+        self.calls = 0
+
+    def before(self, args, kwargs):
+        self.calls += 1
+        return NOT_SET
+
+
+def _overrides(layer, hook):
+    return getattr(type(layer), hook) is not getattr(Layer, hook)
+
+
+def fuse(*layers):
+    """ Fuses the layers (outermost first, the same order you'd stack decorators in) into a single wrapper """
+
+    def wrapper(func):
+        parameters = list(inspect.signature(func).parameters.values())
+        is_async = inspect.iscoroutinefunction(func)
+        # Everything the generated code names itself starts with _fz_, so it can't collide with the function's parameters
+        for param in parameters:
+            if param.name.startswith('_fz_'):
+                raise ValueError(f'Cannot fuse {func.__qualname__}: parameter names starting with _fz_ are reserved')
+        namespace = {'_fz_func': func, '_fz_NOT_SET': NOT_SET}
+
+        # Rebuild the parameter list, with defaults looked up from the namespace.
+        # positional / keyword are the expressions used to pack args and kwargs for the hooks.
+        params, call_args, positional, keyword = [], [], [], []
+        for i, param in enumerate(parameters):
+            if param.kind is param.VAR_POSITIONAL:
+                params.append('*' + param.name)
+                call_args.append('*' + param.name)
+                positional.append('*' + param.name)
+                continue
+            if param.kind is param.VAR_KEYWORD:
+                params.append('**' + param.name)
+                call_args.append('**' + param.name)
+                keyword.append('**' + param.name)
+                continue
+
+            if param.kind is param.KEYWORD_ONLY and not any(
+                    p.kind in (p.KEYWORD_ONLY, p.VAR_POSITIONAL) for p in parameters[:i]):
+                params.append('*')
+
+            text = param.name
+            if param.default is not param.empty:
+                namespace[f'_fz_default_{param.name}'] = param.default
+                text += f'=_fz_default_{param.name}'
+            params.append(text)
+
+            if param.kind is param.KEYWORD_ONLY:
+                call_args.append(f'{param.name}={param.name}')
+                keyword.append(f'{param.name!r}: {param.name}')
+            else:
+                call_args.append(param.name)
+                positional.append(param.name)
+
+            is_last_positional_only = param.kind is param.POSITIONAL_ONLY and (
+                    i + 1 == len(parameters) or parameters[i + 1].kind is not param.POSITIONAL_ONLY)
+            if is_last_positional_only:
+                params.append('/')
+
+        body = [f"_fz_value = {'await ' if is_async else ''}_fz_func({', '.join(call_args)})"]
+
+        # Build the body from the innermost layer outwards, wrapping the code generated so far
+        for i in reversed(range(len(layers))):
+            layer = layers[i]
+            namespace[f'_fz_layer{i}'] = layer
+            hook_args = '_fz_args, _fz_kwargs'
+
+            if _overrides(layer, 'error'):
+                body = ['try:'] + ['    ' + line for line in body]
+                body += ['except Exception as _fz_e:', f'    _fz_value = _fz_layer{i}.error({hook_args}, _fz_e)']
+                if _overrides(layer, 'after'):
+                    body += ['else:', f'    _fz_value = _fz_layer{i}.after({hook_args}, _fz_value)']
+            elif _overrides(layer, 'after'):
+                body += [f'_fz_value = _fz_layer{i}.after({hook_args}, _fz_value)']
+
+            if _overrides(layer, 'before'):
+                body = [f'_fz_value = _fz_layer{i}.before({hook_args})', 'if _fz_value is _fz_NOT_SET:'] + [
+                    '    ' + line for line in body
+                ]
+
+        # Pack the arguments once for all the layers, instead of once per layer
+        packed = []
+        if layers:
+            trailing_comma = ',' if len(positional) == 1 else ''
+            packed = [f"_fz_args = ({', '.join(positional)}{trailing_comma})", f"_fz_kwargs = {{{', '.join(keyword)}}}"]
+
+        source = '\n'.join(
+            [f"{'async ' if is_async else ''}def _fz_fused({', '.join(params)}):"]
+            + ['    ' + line for line in packed + body + ['return _fz_value']]
+        )
+
+        exec(source, namespace)
+        fused = namespace['_fz_fused']
+        fused.__source__ = source  # Handy for seeing what was generated
+        return functools.wraps(func)(fused)
+
+    return wrapper
+
+
+@fuse(DebugLayer('multiply'), ExceptionLayer(TypeError, err_msg='Cant multiply those...'), CacheLayer())
+def multiply(x, y=2):
+    return x * y
+
+
+multiply(5)  # Calling multiply(5, 2) / 'multiply' returned 10
+multiply(5)  # Cache hit, but the debug layer still prints like it would with stacked decorators
+multiply(None, None)  # Logs the error and returns None
+
+
+# Microbenchmark: the same 4 layer stack as nested wrappers vs fused into one wrapper
+import timeit
+
+
+def count_calls(func):
+    @functools.wraps(func)
+    def wrapper_count_calls(*args, **kwargs):
+        wrapper_count_calls.calls += 1
+        return func(*args, **kwargs)
+
+    wrapper_count_calls.calls = 0
+    return wrapper_count_calls
+
+
+def benchmark_fused_decorators(number=200_000):
+    def subtract(x, y):
+        return x - y
+
+    nested = count_calls(count_calls(exception_handler(TypeError)(count_calls(subtract))))
+    fused = fuse(CountCallsLayer(), CountCallsLayer(), ExceptionLayer(TypeError), CountCallsLayer())(subtract)
+
+    for name, func in [('undecorated', subtract), ('nested', nested), ('fused', fused)]:
+        seconds = min(timeit.repeat(lambda: func(10, 5), number=number, repeat=3))
+        print(f'{name:>12}: {seconds / number * 1e9:.0f} ns per call')
+
+
+if __name__ == '__main__':
+    benchmark_fused_decorators()
@@ -107,6 +107,123 @@ class D:
         return len(os.listdir(self.dirname))
 
 
+# Computing the answer on every lookup can be expensive though. DirectorySize reads the whole directory on every access,
+# which on a directory with thousands of files stalls whoever is asking.
+# cached_computed is like @property, but remembers the value until an "invalidation key" changes.
+# For a directory, a cheap os.stat() tells us if anything was added, removed or renamed (the mtime changes),
+# or if the directory was replaced by a new one (the inode changes), without reading the entries.
+
+# check_interval: how long (in seconds) to trust the cached value without even computing the key
+# max_age: recompute after this long even if the key didn't change, for changes the key can't see
+#          (e.g. files growing in place, or anything inside a subdirectory)
+
+import time
+
+
+class cached_computed:
+    def __init__(self, func=None, *, key, check_interval=None, max_age=None):
+        self.func = func
+        self.key = key
+        self.check_interval = check_interval
+        self.max_age = max_age
+
+    def __call__(self, func):
+        # Allows using it as a decorator with arguments: @cached_computed(key=...)
+        self.func = func
+        return self
+
+    def __set_name__(self, owner, name):
+        self.private_name = '_' + name + '_cache'
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+
+        now = time.monotonic()
+        cache = obj.__dict__.get(self.private_name)  # [key, value, computed_at, checked_at]
+
+        if cache is not None and (self.max_age is None or now - cache[2] < self.max_age):
+            if self.check_interval is not None and now - cache[3] < self.check_interval:
+                return cache[1]
+
+            key = self.key(obj)
+            if key == cache[0]:
+                cache[3] = now
+                return cache[1]
+        else:
+            key = self.key(obj)
+
+        value = self.func(obj)
+        obj.__dict__[self.private_name] = [key, value, now, now]
+        return value
+
+    def invalidate(self, obj):
+        obj.__dict__.pop(self.private_name, None)
+
+
+def directory_key(dirname):
+    stat = os.stat(dirname)
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def count_entries(dirname):
+    # os.scandir doesn't build a list of names like os.listdir does
+    with os.scandir(dirname) as entries:
+        return sum(1 for _ in entries)
+
+
+def total_bytes(dirname):
+    """ Total size of all the files under dirname, recursively """
+    total = 0
+    dirnames = [dirname]
+    while dirnames:
+        with os.scandir(dirnames.pop()) as entries:
+            for entry in entries:
+                # scandir already knows the entry type from reading the directory, so no extra stat for that
+                if entry.is_dir(follow_symlinks=False):
+                    dirnames.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+class CachedDirectorySize(cached_computed):
+    """ Drop in replacement for DirectorySize, set recursive_bytes=True to get the total bytes under the directory instead """
+
+    def __init__(self, recursive_bytes=False, check_interval=None, max_age=None):
+        compute = total_bytes if recursive_bytes else count_entries
+        super().__init__(
+            lambda obj: compute(obj.dirname),
+            key=lambda obj: directory_key(obj.dirname),
+            check_interval=check_interval,
+            max_age=max_age,
+        )
+
+
+class CachedDirectory:
+    size = CachedDirectorySize(check_interval=0.5)
+    total_bytes = CachedDirectorySize(recursive_bytes=True, check_interval=0.5, max_age=60)
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+
+cached_directory = CachedDirectory('.')
+cached_directory.size  # Reads the directory
+cached_directory.size  # Served from the cache, until something in the directory changes
+
+
+# It works for any expensive attribute that has a cheap way of telling whether it's out of date
+class Config:
+    def __init__(self, path):
+        self.path = path
+
+    @cached_computed(key=lambda self: os.stat(self.path).st_mtime_ns)
+    def lines(self):
+        with open(self.path) as f:
+            return f.read().splitlines()
+
+
 # Example 3:
 # A popular use case for descriptors is managing access to instance data.
 # The descriptor is assigned to a public attr in the class dict while the actual data is stored as a private attr in the instance ict.
@@ -153,16 +270,155 @@ p.birthday()
 # INFO:root:Accessing 'age' giving 25
 # INFO:root:Updating 'age' to 26
 
+# LoggedAgeAccess does all the logging work in the caller's thread on every get and set:
+# building a LogRecord, formatting the message and writing it out. That's tens of microseconds per attribute access.
+
+# AuditLog moves that off the hot path. An attribute access only appends a small tuple to a queue,
+# and a background thread formats and logs the events. On top of that it can:
+# - skip everything (not even the tuple) when the logger wouldn't log at that level anyway
+# - sample, e.g. sample_rate=0.01 keeps roughly 1 in 100 events
+# - cap the rate, e.g. max_per_second=1000 drops events over that budget (counted in .dropped)
+# Formatting later means the value could have changed by then, so anything mutable (a list, a dict, an object)
+# is turned into its repr straight away. Only immutable values like numbers and strings are queued as they are.
+
+import atexit
+import queue
+import random
+import threading
+
+
+class _Repr(str):
+    """ A repr taken at access time, that %r logs as is (instead of quoting it again) """
+
+    def __repr__(self):
+        return str(self)
+
+
+_IMMUTABLE_TYPES = {int, float, complex, bool, str, bytes, type(None)}
+
+
+class AuditLog:
+    def __init__(self, logger=None, level=logging.INFO, sample_rate=1.0, max_per_second=None):
+        self.logger = logger or logging.getLogger()
+        self.level = level
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+
+        self.events = queue.SimpleQueue()
+        self.dropped = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def record(self, action, name, value):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+
+        if self.max_per_second is not None:
+            # The counters aren't locked, so under heavy contention the cap is approximate, which is fine for auditing
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_count = 0
+            if self.window_count >= self.max_per_second:
+                self.dropped += 1
+                return
+            self.window_count += 1
+
+        if type(value) not in _IMMUTABLE_TYPES:
+            value = _Repr(repr(value))  # Snapshot it, the drain thread would log whatever it looks like by then
+        if self.thread is None:
+            self._start()
+        self.events.put((action, name, value))
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._drain, daemon=True)
+                self.thread.start()
+                # Log whatever is still queued when the program exits
+                atexit.register(self.close)
+
+    def _drain(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+
+            action, name, value = event
+            if action == 'get':
+                self.logger.log(self.level, 'Accessing %r giving %r', name, value)
+            else:
+                self.logger.log(self.level, 'Updating %r to %r', name, value)
+
+    def close(self):
+        """ Waits for the queued events to be logged and stops the background thread """
+        with self.lock:
+            if self.thread is not None:
+                self.events.put(None)
+                self.thread.join()
+                self.thread = None
+
+
+class AuditedAttribute:
+    """ Same as LoggedAgeAccess, but works for any attribute and hands the logging to an AuditLog """
+
+    def __init__(self, audit_log):
+        self.audit_log = audit_log
+
+    def __set_name__(self, owner, name):
+        self.public_name = name
+        self.private_name = '_' + name
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.private_name)
+        self.audit_log.record('get', self.public_name, value)
+        return value
+
+    def __set__(self, obj, value):
+        self.audit_log.record('set', self.public_name, value)
+        setattr(obj, self.private_name, value)
+
+
+audit_log = AuditLog(sample_rate=0.1, max_per_second=1000)
+
+
+class AuditedPerson:
+    age = AuditedAttribute(audit_log)
+
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+    def birthday(self):
+        self.age += 1
+
+
+AuditedPerson('mike', 25).birthday()  # Logs (roughly 1 in 10 of) the accesses from the background thread
+
+
 # Example 4 : Practical Validator Example
 # A validator is a descriptor for managed attribute access. Prior to storing any data, it verifies that the new value meets various type and range restrictions.
 # If those restrictions aren’t met, it raises an exception to prevent data corruption at its source.
 
 from abc import ABC, abstractmethod
 
+# numpy is optional, it's only used to validate whole columns at once (see Example 7)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Validator(ABC):
 
     def __set_name__(self, owner, name):
+        self.public_name = name
         self.private_name = '_' + name
 
     def __get__(self, obj, objtype=None):
@@ -176,6 +432,29 @@ class Validator(ABC):
     def validate(self, value):
         pass
 
+    def inline_checks(self, var, ref):
+        """ Returns (source lines, constants) that validate the variable var, used by validated_init
+
+        ref is the name the validator is bound to in the generated code, constants are extra names it needs.
+        Subclasses can override this to inline their checks, by default it just calls validate()
+        """
+        return [f'{ref}.validate({var})'], {}
+
+    def validate_column(self, values):
+        """ Validates a whole column (list or numpy array) without raising, returns a mask that's True for bad rows
+
+        Subclasses override this with a vectorised version, by default it calls validate() on every value.
+        """
+        mask = []
+        for value in values:
+            try:
+                self.validate(value)
+            except (TypeError, ValueError):
+                mask.append(True)
+            else:
+                mask.append(False)
+        return mask
+
 
 class OneOf(Validator):
 
@@ -186,6 +465,18 @@ class OneOf(Validator):
         if value not in self.options:
             raise ValueError(f'Expected {value!r} to be one of {self.options!r}')
 
+    def inline_checks(self, var, ref):
+        return [
+            f'if {var} not in {ref}_options:',
+            f"    raise ValueError(f'Expected {{{var}!r}} to be one of {{{ref}_options!r}}')",
+        ], {f'{ref}_options': self.options}
+
+    def validate_column(self, values):
+        if np is not None and isinstance(values, np.ndarray):
+            return ~np.isin(values, list(self.options))
+        options = self.options
+        return [value not in options for value in values]
+
 
 class Number(Validator):
 
@@ -205,6 +496,42 @@ class Number(Validator):
                 f'Expected {value!r} to be no more than {self.maxvalue!r}'
             )
 
+    def inline_checks(self, var, ref):
+        lines = [
+            f'if not isinstance({var}, (int, float)):',
+            f"    raise TypeError(f'Expected {{{var}!r}} to be an int or float')",
+        ]
+        if self.minvalue is not None:
+            lines += [
+                f'if {var} < {ref}_min:',
+                f"    raise ValueError(f'Expected {{{var}!r}} to be at least {{{ref}_min!r}}')",
+            ]
+        if self.maxvalue is not None:
+            lines += [
+                f'if {var} > {ref}_max:',
+                f"    raise ValueError(f'Expected {{{var}!r}} to be no more than {{{ref}_max!r}}')",
+            ]
+        return lines, {f'{ref}_min': self.minvalue, f'{ref}_max': self.maxvalue}
+
+    def validate_column(self, values):
+        # A numeric array has already been type checked by numpy, so only the range checks are left.
+        # Object arrays (mixed types) fall back to the list version.
+        if np is not None and isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+            mask = np.zeros(len(values), dtype=bool)
+            if self.minvalue is not None:
+                mask |= values < self.minvalue
+            if self.maxvalue is not None:
+                mask |= values > self.maxvalue
+            return mask
+
+        minvalue, maxvalue = self.minvalue, self.maxvalue
+        return [
+            not isinstance(value, (int, float))
+            or (minvalue is not None and value < minvalue)
+            or (maxvalue is not None and value > maxvalue)
+            for value in values
+        ]
+
 
 class String(Validator):
 
@@ -229,6 +556,55 @@ class String(Validator):
                 f'Expected {self.predicate} to be true for {value!r}'
             )
 
+    def inline_checks(self, var, ref):
+        lines = [
+            f'if not isinstance({var}, str):',
+            f"    raise TypeError(f'Expected {{{var}!r}} to be an str')",
+        ]
+        if self.minsize is not None:
+            lines += [
+                f'if len({var}) < {ref}_min:',
+                f"    raise ValueError(f'Expected {{{var}!r}} to be no smaller than {{{ref}_min!r}}')",
+            ]
+        if self.maxsize is not None:
+            lines += [
+                f'if len({var}) > {ref}_max:',
+                f"    raise ValueError(f'Expected {{{var}!r}} to be no bigger than {{{ref}_max!r}}')",
+            ]
+        if self.predicate is not None:
+            lines += [
+                f'if not {ref}_predicate({var}):',
+                f"    raise ValueError(f'Expected {{{ref}_predicate}} to be true for {{{var}!r}}')",
+            ]
+        return lines, {f'{ref}_min': self.minsize, f'{ref}_max': self.maxsize, f'{ref}_predicate': self.predicate}
+
+    def validate_column(self, values):
+        if np is not None and isinstance(values, np.ndarray) and values.dtype.kind == 'U':
+            mask = np.zeros(len(values), dtype=bool)
+            if self.minsize is not None or self.maxsize is not None:
+                lengths = np.char.str_len(values)
+                if self.minsize is not None:
+                    mask |= lengths < self.minsize
+                if self.maxsize is not None:
+                    mask |= lengths > self.maxsize
+            if self.predicate is not None:
+                # str methods like str.isupper have a vectorised twin in np.char, anything else is called per value
+                name = getattr(self.predicate, '__name__', None)
+                if getattr(str, name or '', None) is self.predicate and hasattr(np.char, name):
+                    mask |= ~getattr(np.char, name)(values)
+                else:
+                    mask |= ~np.array([bool(self.predicate(value)) for value in values.tolist()], dtype=bool)
+            return mask
+
+        minsize, maxsize, predicate = self.minsize, self.maxsize, self.predicate
+        return [
+            not isinstance(value, str)
+            or (minsize is not None and len(value) < minsize)
+            or (maxsize is not None and len(value) > maxsize)
+            or (predicate is not None and not predicate(value))
+            for value in values
+        ]
+
 
 # This is a cleaner way of validating instead of having a large constructor with validation logic
 # The descriptors prevent invalid instances from being created
@@ -242,3 +618,333 @@ class Component:
         self.name = name
         self.kind = kind
         self.quantity = quantity
+
+
+# Example 5: Generating a specialised __init__
+# Constructing a Component runs three __set__ calls, each one dispatching to validate() and doing a setattr with a string name.
+# And every read goes through __get__ and a getattr.
+# That's fine for a handful of objects, but adds up when we're creating millions of validated records.
+
+# The validated_init class decorator reads the Validator descriptors off the class and generates an __init__
+# (like dataclasses do) with every check written out inline, storing the values straight into the instance dict.
+
+# Each Validator is then swapped for a ValidatedField, a descriptor with only __set__ and no __get__.
+# It's still a data descriptor, so assignments are validated, but since there's no __get__,
+# reads fall through to the instance dict (step 2 of the lookup order above) and cost the same as a plain attribute.
+
+class ValidatedField:
+    def __init__(self, validator):
+        self.validator = validator
+        self.name = validator.public_name
+
+    def __set__(self, obj, value):
+        self.validator.validate(value)
+        obj.__dict__[self.name] = value
+
+
+# Classes using __slots__ (see Example 6) have no instance dict, so validated_init stores into the slots instead
+# and leaves the validators in place to read them.
+import types
+
+
+def validated_init(cls):
+    """ Generates an __init__ taking the validated attributes in the order they're declared on the class """
+    validators = [v for v in vars(cls).values() if isinstance(v, Validator)]
+    # The generated code's own names all start with _v_, so they can't collide with the fields (the __init__ arguments)
+    for validator in validators:
+        if validator.public_name == 'self' or validator.public_name.startswith('_v_'):
+            raise ValueError(f'{cls.__qualname__}: a validated field can\'t be called self or start with _v_')
+    namespace = {}
+    body = []
+
+    for validator in validators:
+        name = validator.public_name
+        ref = f'_v_{name}'
+        lines, constants = validator.inline_checks(name, ref)
+        namespace[ref] = validator
+        namespace.update(constants)
+        body += lines
+
+    # A slot declared for the private name shows up as a member descriptor on the class
+    is_slotted = {v: isinstance(getattr(cls, v.private_name, None), types.MemberDescriptorType) for v in validators}
+    body += [f'self.{v.private_name} = {v.public_name}' for v in validators if is_slotted[v]]
+
+    unslotted = [v for v in validators if not is_slotted[v]]
+    if unslotted:
+        body.append('_v_dict = self.__dict__')
+        body += [f'_v_dict[{v.public_name!r}] = {v.public_name}' for v in unslotted]
+
+    source = '\n'.join(
+        [f"def __init__(self, {', '.join(v.public_name for v in validators)}):"]
+        + ['    ' + line for line in body]
+    )
+    exec(source, namespace)
+
+    cls.__init__ = namespace['__init__']
+    cls.__init__.__qualname__ = f'{cls.__qualname__}.__init__'
+    cls.__init__.__source__ = source
+    for validator in unslotted:
+        setattr(cls, validator.public_name, ValidatedField(validator))
+    return cls
+
+
+@validated_init
+class FastComponent:
+    name = String(minsize=3, maxsize=10, predicate=str.isupper)
+    kind = OneOf('wood', 'metal', 'plastic')
+    quantity = Number(minvalue=0)
+
+
+fc = FastComponent('WIDGET', 'metal', 5)
+vars(fc)  # {'name': 'WIDGET', 'kind': 'metal', 'quantity': 5}
+fc.quantity = 10  # Still validated, fc.quantity = -1 raises a ValueError
+
+
+# Example 6: Validators with __slots__
+# By default the validators store the value in the instance dict under '_' + name, so every Component carries a dict.
+# Declaring the private names in __slots__ gets rid of the dict, the values live in fixed slots on the object instead.
+# The Validator doesn't need to change: getattr/setattr with the private name finds the slot's member descriptor on the class.
+# (Calling the member descriptor's __get__/__set__ ourselves from python is actually slower than letting getattr do it.)
+
+class SlottedComponent:
+    __slots__ = ('_name', '_kind', '_quantity')
+
+    name = String(minsize=3, maxsize=10, predicate=str.isupper)
+    kind = OneOf('wood', 'metal', 'plastic')
+    quantity = Number(minvalue=0)
+
+    def __init__(self, name, kind, quantity):
+        self.name = name
+        self.kind = kind
+        self.quantity = quantity
+
+
+sc = SlottedComponent('WIDGET', 'wood', 3)
+sc.quantity  # 3, read from the _quantity slot
+
+
+# Both tricks can be combined, the generated __init__ stores straight into the slots
+@validated_init
+class FastSlottedComponent:
+    __slots__ = ('_name', '_kind', '_quantity')
+
+    name = String(minsize=3, maxsize=10, predicate=str.isupper)
+    kind = OneOf('wood', 'metal', 'plastic')
+    quantity = Number(minvalue=0)
+
+
+# Example 7: Validating columns
+# When importing millions of rows, creating an object per row just to run the validators is the bottleneck.
+# Instead we can hand each validator a whole column (a list, or a numpy array) and check it in one pass,
+# getting back a mask of the bad rows instead of an exception on the first one.
+
+def validate_columns(cls, **columns):
+    """ Validates columns against the validators of cls, e.g. validate_columns(Component, name=[...], ...)
+
+    Returns (masks, bad_rows): a mask per column, and a mask of rows with at least one bad value.
+    """
+    validators = {name: v for name, v in vars(cls).items() if isinstance(v, (Validator, ValidatedField))}
+    masks = {}
+    for name, values in columns.items():
+        validator = validators[name]
+        if isinstance(validator, ValidatedField):
+            validator = validator.validator
+        masks[name] = validator.validate_column(values)
+
+    if np is not None:
+        bad_rows = np.logical_or.reduce([np.asarray(mask, dtype=bool) for mask in masks.values()])
+    else:
+        bad_rows = [any(row) for row in zip(*masks.values())]
+    return masks, bad_rows
+
+
+masks, bad_rows = validate_columns(
+    Component,
+    name=['WIDGET', 'bolt', 'NUT'],
+    kind=['metal', 'wood', 'gold'],
+    quantity=[5, -1, 2],
+)
+# bad_rows -> [False, True, True], the last two rows have a bad value
+
+
+# Example 8: Reactive computed attributes
+# Back to the Circle problem from the top of the file: Circle goes stale, and Circle2's @property recomputes on every read.
+# For expensive derived values that are read far more often than their inputs change, we want the best of both:
+# remember the value, and recompute it only when one of its inputs changed.
+
+# Source attributes hold plain values, and every assignment stamps them with a new version number.
+# Computed attributes declare which attributes they depend on (sources or other computed attributes).
+# A computed attribute remembers the versions of its dependencies it was computed from,
+# and only calls its function again when one of them is different.
+
+# Each instance also keeps a single version counter that every source assignment bumps.
+# If that hasn't moved since a computed attribute was last checked, nothing can have changed and the read is a dict lookup.
+
+class Source:
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = '_' + name
+        self.version_name = '_' + name + '_version'
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.private_name]
+        except KeyError:
+            # Not set yet, an AttributeError keeps hasattr() and getattr() with a default working
+            raise AttributeError(self.name) from None
+
+    def __set__(self, obj, value):
+        d = obj.__dict__
+        d['_reactive_version'] = version = d.get('_reactive_version', 0) + 1
+        d[self.private_name] = value
+        d[self.version_name] = version
+
+    def version(self, obj):
+        return obj.__dict__.get(self.version_name, 0)
+
+
+def _changed(value, previous):
+    if value is previous:
+        return False
+    try:
+        return bool(value != previous)
+    except (TypeError, ValueError):
+        return True  # E.g. numpy arrays, where != compares element by element and has no single truth value
+
+
+class Computed:
+    def __init__(self, func, depends_on):
+        self.func = func
+        self.depends_on = depends_on
+        self.dependencies = {}  # class -> its descriptors for depends_on, a subclass can override any of them
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.cache_name = '_' + name + '_cache'
+        self._dependencies(owner)  # Fail when the class is created, not on the first read
+
+    def _dependencies(self, cls):
+        dependencies = self.dependencies.get(cls)
+        if dependencies is None:
+            dependencies = [getattr(cls, name, None) for name in self.depends_on]
+            for name, dependency in zip(self.depends_on, dependencies):
+                if not isinstance(dependency, (Source, Computed)):
+                    raise TypeError(f'{self.name!r} depends on {cls.__name__}.{name}, which isn\'t a Source or Computed')
+            self.dependencies[cls] = dependencies
+        return dependencies
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        return self.refresh(obj)[2]
+
+    def __set__(self, obj, value):
+        # Defining __set__ makes this a data descriptor, so an instance attribute can't shadow it
+        raise AttributeError(f'{self.name!r} is computed from {self.depends_on!r} and can\'t be set')
+
+    def version(self, obj):
+        return self.refresh(obj)[3]
+
+    def refresh(self, obj):
+        """ Makes sure the cached value is up to date, returns the cache: [checked_at, dependency versions, value, version] """
+        d = obj.__dict__
+        instance_version = d.get('_reactive_version', 0)
+        cache = d.get(self.cache_name)
+
+        # Fast path: no source on this instance changed since the last check
+        if cache is not None and cache[0] == instance_version:
+            return cache
+
+        versions = tuple(dependency.version(obj) for dependency in self._dependencies(type(obj)))
+
+        if cache is None:
+            cache = d[self.cache_name] = [instance_version, versions, self.func(obj), 1]
+        elif cache[1] != versions:
+            value = self.func(obj)
+            # Only bump our own version when the value really changed, so anything depending on us doesn't recompute for nothing
+            if _changed(value, cache[2]):
+                cache[2] = value
+                cache[3] += 1
+            cache[1] = versions
+        cache[0] = instance_version
+        return cache
+
+
+def computed(*depends_on):
+    """ Decorator version of Computed, e.g. @computed('radius') """
+
+    def computed_decorator(func):
+        return Computed(func, depends_on)
+
+    return computed_decorator
+
+
+class Circle3:
+    PI = 3.14
+    radius = Source()
+
+    def __init__(self, radius):
+        self.radius = radius
+
+    @computed('radius')
+    def circumference(self):
+        return 2 * self.radius * self.PI
+
+    @computed('radius')
+    def area(self):
+        return self.PI * self.radius ** 2
+
+    # Computed attributes can depend on other computed attributes
+    @computed('circumference', 'area')
+    def ratio(self):
+        return self.area / self.circumference
+
+
+c3 = Circle3(2)
+c3.circumference  # 12.56, computed
+c3.circumference  # 12.56, cached
+c3.radius = 3
+c3.circumference  # 18.84, recomputed because radius changed
+c3.ratio  # 1.5, computed from the cached circumference and area
+
+
+# Memory / speed comparison of the layouts
+import timeit
+import tracemalloc
+
+
+def benchmark_validated_layouts(count=100_000):
+    for cls in [Component, SlottedComponent, FastComponent, FastSlottedComponent]:
+        tracemalloc.start()
+        components = [cls('WIDGET', 'metal', i) for i in range(count)]
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        component = components[0]
+        create = min(timeit.repeat(lambda: cls('WIDGET', 'metal', 5), number=count, repeat=3))
+        read = min(timeit.repeat(lambda: component.quantity, number=count, repeat=3))
+
+        print(f'{cls.__name__:>20}: {memory / count:.0f} bytes per instance, '
+              f'{create / count * 1e9:.0f} ns to create, {read / count * 1e9:.0f} ns per read')
+
+
+def benchmark_validate_columns(count=1_000_000):
+    names = ['WIDGET', 'bolt', 'NUT'] * (count // 3)
+    kinds = ['metal', 'wood', 'gold'] * (count // 3)
+    quantities = [5, -1, 2] * (count // 3)
+    columns = {
+        'lists': dict(name=names, kind=kinds, quantity=quantities),
+    }
+    if np is not None:
+        columns['numpy arrays'] = dict(name=np.array(names), kind=np.array(kinds), quantity=np.array(quantities))
+
+    for label, cols in columns.items():
+        seconds = min(timeit.repeat(lambda: validate_columns(Component, **cols), number=1, repeat=3))
+        print(f'{label:>20}: {seconds / len(names) * 1e9:.0f} ns per row')
+
+
+if __name__ == '__main__':
+    benchmark_validated_layouts()
+    benchmark_validate_columns()
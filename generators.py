@@ -10,25 +10,32 @@
 # This would most likely cause a memory error if the file is huge.
 # A better way would be to use the generator alternative below.
 def csv_reader_iterate(file_name):
-    file = open(file_name)
-    result = file.read().split("\n")
+    with open(file_name) as file:
+        result = file.read().split("\n")
     return result
 
 
 # This iterates through the rows in a file and yields a row
 # This is a generator function (yield indicates this)
 def csv_reader_generator(file_name):
-    # Its also possible to define a generator expression (the generator version of list comprehension)
-    for row in open(file_name, 'r'):
-        # Using yield will result in a generator object.
-        yield row
+    # The with block closes the file once the generator is exhausted, or closed early (e.g. by breaking out of the loop)
+    with open(file_name, 'r') as file:
+        for row in file:
+            # Using yield will result in a generator object.
+            yield row
 
 
+# Reading big CSV files faster (in batches, on every core, with random access, from asyncio code, or following a file
+# that keeps growing): see csv_readers.py
+
 filename = 'data.csv'
 # Its also possible to define a generator expression (the generator version of list comprehension)
 # When you call a generator function or use a generator expression, you return a special iterator called a generator
 csv_gen = (row for row in open(filename))
 
+# e.g. from csv_readers import csv_batch_reader
+# for batch in csv_batch_reader(filename, columns=True, header=True): batch['price'] -> ('1.0', '2.5', ...)
+
 
 # You can define an infinite sequence generation with generators.
 # Generating an infinite sequence requires the use of a generator since computer memory is finite
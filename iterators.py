@@ -52,6 +52,9 @@ class Repeat:
     def __next__(self):
         return self.value
 
+    def next_batch(self, n):
+        return [self.value] * n
+
 
 # Now lets actually define an iterator that isn't an infinite loop.
 # Iterators use exceptions to structure control flow.
@@ -73,6 +76,15 @@ class BoundedRepeater:
         self.count += 1
         return self.value
 
+    # Optional batch protocol, see the end of the file
+    def next_batch(self, n):
+        n = min(n, self.max_repeats - self.count)
+        self.count += n
+        return [self.value] * n
+
+    def __length_hint__(self):
+        return self.max_repeats - self.count
+
 
 # This gives us the desired result. Iteration stops after the number of repetitions defined in the max_repeats parameter:
 
@@ -89,3 +101,36 @@ while True:
     print(item)
 
 # Every time next() is called in this loop we check for a StopIteration exception and break the while loop if necessary.:w:wq
+
+
+# ------------- Iterating in batches -------------
+
+# Every item a for loop gets from an iterator costs a __next__ call (and the loop has to check for StopIteration).
+# When the consumer handles items in chunks anyway, we can skip most of that with an optional batch protocol:
+# next_batch(n) returns a list of up to n items, and an empty list once the iterator is exhausted.
+# BoundedRepeater and Repeat implement it above. BoundedRepeater also has __length_hint__, which tells list() and
+# friends how many items are left, so they can allocate the right size up front.
+
+# iter_batches uses next_batch when the iterator has it, and falls back to itertools.islice for any other iterator.
+
+import itertools
+
+
+def iter_batches(iterable, n):
+    """ Yields lists of up to n items from the iterable """
+    iterator = iter(iterable)
+    next_batch = getattr(iterator, 'next_batch', None)
+
+    if next_batch is not None:
+        while batch := next_batch(n):
+            yield batch
+    else:
+        while batch := list(itertools.islice(iterator, n)):
+            yield batch
+
+
+for batch in iter_batches(BoundedRepeater('Mike', 10), 4):
+    print(batch)  # ['Mike', 'Mike', 'Mike', 'Mike'], ['Mike', 'Mike', 'Mike', 'Mike'], ['Mike', 'Mike']
+
+for batch in iter_batches(range(10), 4):
+    print(batch)  # [0, 1, 2, 3], [4, 5, 6, 7], [8, 9]
@@ -0,0 +1,320 @@
+# Generator pipelines
+# generators.py shows single generators. Real jobs chain lots of them: read -> parse -> filter -> transform -> write.
+# Chaining generators by hand works, but everything runs one item at a time on one core.
+
+# A Pipeline is a chain of stages (map, filter, batch, unbatch) between a source (any iterable) and a sink.
+# Every stage runs in its own thread, connected to the next stage by a bounded queue.
+# When a stage is slower than the one before it, the queue between them fills up and the faster stage blocks on put()
+# until there's room again (backpressure), so memory use stays bounded no matter how big the source is.
+
+# Each map/filter stage can run:
+# - 'inline': in the stage's own thread
+# - 'thread': on a ThreadPoolExecutor, for I/O bound work (see threads.py)
+# - 'process': on a ProcessPoolExecutor, for CPU bound work (see multi-processing.py)
+#   Items are sent to worker processes in chunks, since pickling items one at a time costs more than it saves.
+#   The function has to be picklable, e.g. defined at module level.
+# Pool stages keep items in order.
+
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+_DONE = object()  # Put on a queue after the last item
+
+
+class PipelineError(Exception):
+    """ Raised from the pipeline when one of its stages failed """
+
+
+class _Stopped(Exception):
+    """ Raised inside a stage when another stage failed and the pipeline is shutting down """
+
+
+def _run_chunk(kind, func, chunk):
+    """ Runs in the pool: applies a map or filter stage to a chunk of items """
+    if kind == 'map':
+        return [func(item) for item in chunk]
+    return [item for item in chunk if func(item)]
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0  # Seconds spent producing items, including waiting for input
+        self.waiting = 0.0  # Seconds spent waiting for input
+        self.started = None
+        self.finished = None
+        self.queue_depth_total = 0
+        self.queue_depth_samples = 0
+        self.queue_depth_max = 0
+
+    def sample_queue(self, depth):
+        self.queue_depth_total += depth
+        self.queue_depth_samples += 1
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    def as_dict(self):
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        return {
+            'stage': self.name,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'items_per_second': self.items_out / elapsed if elapsed else 0.0,
+            'busy': self.busy - self.waiting,
+            # Depth of the stage's output queue: always full means the next stage is the bottleneck
+            'avg_queue_depth': self.queue_depth_total / self.queue_depth_samples if self.queue_depth_samples else 0.0,
+            'max_queue_depth': self.queue_depth_max,
+        }
+
+
+class Stage:
+    def __init__(self, kind, func=None, mode='inline', workers=None, chunk_size=None, size=None):
+        if mode not in ('inline', 'thread', 'process'):
+            raise ValueError(f'Expected mode to be one of inline, thread or process, got {mode!r}')
+        if mode != 'inline' and kind not in ('map', 'filter'):
+            raise ValueError(f'{kind} stages can only run inline')
+
+        self.kind = kind
+        self.func = func
+        self.mode = mode
+        self.workers = workers
+        self.chunk_size = chunk_size or (64 if mode == 'process' else 1)
+        self.size = size
+        self.stats = StageStats(f'{kind}({getattr(func, "__name__", size)}, {mode})')
+
+    def process(self, items):
+        """ Generator applying the stage to the items from the previous stage """
+        if self.kind == 'batch':
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) == self.size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        elif self.kind == 'unbatch':
+            for batch in items:
+                yield from batch
+
+        elif self.mode == 'inline':
+            if self.kind == 'map':
+                for item in items:
+                    yield self.func(item)
+            else:
+                for item in items:
+                    if self.func(item):
+                        yield item
+
+        else:
+            yield from self._process_in_pool(items)
+
+    def _process_in_pool(self, items):
+        executor_class = (
+            concurrent.futures.ThreadPoolExecutor if self.mode == 'thread' else concurrent.futures.ProcessPoolExecutor
+        )
+
+        with executor_class(max_workers=self.workers) as executor:
+            # Keep a bounded number of chunks in flight, and hand out the results in the order they were submitted
+            max_in_flight = 2 * (self.workers or os.cpu_count() or 1)
+            in_flight = collections.deque()
+            chunk = []
+
+            def submit(chunk):
+                if self.chunk_size == 1 and self.kind == 'map':
+                    in_flight.append((False, executor.submit(self.func, chunk[0])))
+                else:
+                    in_flight.append((True, executor.submit(_run_chunk, self.kind, self.func, chunk)))
+
+            def results(first):
+                is_chunk, future = first
+                result = future.result()
+                return result if is_chunk else [result]
+
+            for item in items:
+                chunk.append(item)
+                if len(chunk) == self.chunk_size:
+                    submit(chunk)
+                    chunk = []
+                    while len(in_flight) >= max_in_flight:
+                        yield from results(in_flight.popleft())
+
+            if chunk:
+                submit(chunk)
+            while in_flight:
+                yield from results(in_flight.popleft())
+
+
+class Pipeline:
+    def __init__(self, source, queue_size=1000):
+        self.source = source
+        self.queue_size = queue_size
+        self.stages = []
+        self.stop = threading.Event()
+        self.error = None
+        self.stage_stats = []
+
+    # Building the pipeline: each method adds a stage and returns the pipeline, so they can be chained
+
+    def map(self, func, mode='inline', workers=None, chunk_size=None):
+        self.stages.append(Stage('map', func, mode, workers, chunk_size))
+        return self
+
+    def filter(self, func, mode='inline', workers=None, chunk_size=None):
+        self.stages.append(Stage('filter', func, mode, workers, chunk_size))
+        return self
+
+    def batch(self, size):
+        self.stages.append(Stage('batch', size=size))
+        return self
+
+    def unbatch(self):
+        self.stages.append(Stage('unbatch'))
+        return self
+
+    # Running the pipeline
+
+    def _put(self, q, item):
+        # Block while the queue is full (that's the backpressure), but give up if another stage failed
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.stop.is_set():
+                    raise _Stopped
+
+    def _get_all(self, q, stats):
+        """ Generator over the items of a queue, until the _DONE marker """
+        while True:
+            started = time.perf_counter()
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                stats.waiting += time.perf_counter() - started
+                if self.stop.is_set():
+                    raise _Stopped
+                continue
+            stats.waiting += time.perf_counter() - started
+            if item is _DONE:
+                return
+            stats.items_in += 1
+            yield item
+
+    def _run_stage(self, stage, items, output):
+        stats = stage.stats
+        stats.started = time.perf_counter()
+        try:
+            results = stage.process(items)
+            while True:
+                started = time.perf_counter()
+                try:
+                    result = next(results)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy += time.perf_counter() - started
+                stats.items_out += 1
+                stats.sample_queue(output.qsize())
+                self._put(output, result)
+            self._put(output, _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self.error = self.error or e
+            self.stop.set()
+        finally:
+            stats.finished = time.perf_counter()
+
+    def __iter__(self):
+        # Every run starts from a clean slate, so a pipeline can be run more than once (over a source that can be too)
+        self.stop = threading.Event()
+        self.error = None
+        for stage in self.stages:
+            stage.stats = StageStats(stage.stats.name)
+
+        threads = []
+        source_stats = StageStats('source')
+        previous = None
+
+        for i, stage in enumerate([None] + self.stages):
+            output = queue.Queue(maxsize=self.queue_size)
+            if stage is None:
+                # The source is a stage that just passes its items on
+                source = Stage('map', lambda item: item)
+                source.stats = source_stats
+                target = self._run_stage, (source, iter(self.source), output)
+            else:
+                target = self._run_stage, (stage, self._get_all(previous, stage.stats), output)
+            threads.append(threading.Thread(target=target[0], args=target[1], daemon=True))
+            previous = output
+
+        self.stage_stats = [source_stats] + [stage.stats for stage in self.stages]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for item in self._get_all(previous, StageStats('sink')):
+                yield item
+        except _Stopped:
+            # A stage stopped the pipeline. That should only happen on an error, which is raised below
+            if self.error is None:
+                raise PipelineError('Pipeline stopped without an error from any of its stages')
+        finally:
+            # If the consumer stopped early, tell the stages to stop too
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise PipelineError(f'Pipeline stage failed: {self.error!r}') from self.error
+
+    def sink(self, func=None):
+        """ Runs the pipeline to completion, calling func (if given) with every item. Returns the stats """
+        for item in self:
+            if func is not None:
+                func(item)
+        return self.stats()
+
+    def stats(self):
+        return [stats.as_dict() for stats in self.stage_stats]
+
+
+def parse_line(line):
+    return line.strip().split(',')
+
+
+def is_even_row(row):
+    return int(row[0]) % 2 == 0
+
+
+def cpu_heavy(row):
+    return sum(i * i for i in range(int(row[0]) % 1000)), row
+
+
+def fake_write(batch):
+    time.sleep(0.01)  # Pretend to write the batch to a database
+    return len(batch)
+
+
+if __name__ == "__main__":
+    lines = (f'{i},name-{i}\n' for i in range(20_000))
+
+    stats = (
+        Pipeline(lines, queue_size=500)
+        .map(parse_line)
+        .filter(is_even_row)
+        .map(cpu_heavy, mode='process', chunk_size=256)
+        .batch(500)
+        .map(fake_write, mode='thread', workers=4)
+        .sink()
+    )
+
+    for stage in stats:
+        print(stage)
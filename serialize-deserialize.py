@@ -70,4 +70,909 @@ serialize_dict_into_json_str = json.dumps(user_dict)
 with open('./user.json', 'w') as f:
     serialize_dict_into_json_stream = json.dump(user_dict, f)
 
-print()
\ No newline at end of file
+print()
+
+# --------------- Compiling a Schema ---------------
+
+# For every record, UserSchema.load/dump go through marshmallow's generic machinery: look up each field,
+# dispatch to its (de)serialize method, collect errors, find and call the hooks...
+# That's flexible, but for millions of simple records most of the time goes into the machinery rather than the data.
+
+# compile_schema generates load/dump functions specialised for one schema: the field names are written straight into
+# the code, each value gets an exact type check, and the post_load hook is called directly.
+# Whenever a record isn't the simple case the generated code handles (a missing or unknown key, a value of another type
+# that marshmallow would have to convert or reject, ...), it hands the record to the schema itself.
+# So the output, including errors, is always exactly what marshmallow would give.
+
+# Only the simple options are compiled: Int/Float/Str/Bool fields, no data_key/attribute/validators/load_only/dump_only,
+# and post_load as the only hook. Anything else raises a ValueError, just use the schema directly for those.
+
+import math
+from importlib.metadata import version
+from marshmallow import RAISE, EXCLUDE
+
+# Values each field type accepts as is, on both load and dump
+FAST_TYPES = {
+    fields.Integer: 'type({var}) is int',
+    fields.String: 'type({var}) is str',
+    fields.Boolean: 'type({var}) is bool',
+    # marshmallow rejects nan and infinity when loading floats (unless allow_nan=True)
+    fields.Float: 'type({var}) is float and _isfinite({var})',
+}
+
+_MISS = object()  # Returned by the generated code when a record needs the full schema
+
+
+class CompiledSchema:
+    def __init__(self, schema, fast_load, fast_dump, source):
+        self.schema = schema
+        self.fast_load = fast_load
+        self.fast_dump = fast_dump
+        self.source = source  # Handy for seeing what was generated
+
+    def load(self, data):
+        result = self.fast_load(data)
+        return self.schema.load(data) if result is _MISS else result
+
+    def dump(self, obj):
+        result = self.fast_dump(obj)
+        return self.schema.dump(obj) if result is _MISS else result
+
+    def load_many(self, data):
+        if getattr(self.schema, 'reuses_instance', False):
+            raise ValueError(f'{type(self.schema).__name__} hands out the same instance every time, it can\'t load many')
+        results = []
+        for item in data:
+            result = self.fast_load(item)
+            if result is _MISS:
+                # Let marshmallow handle the whole list, so errors are reported per index exactly like it does
+                return self.schema.load(data, many=True)
+            results.append(result)
+        return results
+
+    def dump_many(self, objs):
+        results = []
+        for obj in objs:
+            result = self.fast_dump(obj)
+            if result is _MISS:
+                return self.schema.dump(objs, many=True)
+            results.append(result)
+        return results
+
+    def loads(self, json_data, many=False):
+        data = self.schema.opts.render_module.loads(json_data)
+        return self.load_many(data) if many else self.load(data)
+
+    def dumps(self, obj, many=False):
+        return self.schema.opts.render_module.dumps(self.dump_many(obj) if many else self.dump(obj))
+
+
+def _check_compilable(schema):
+    if schema.many or schema.only is not None or schema.exclude or schema.partial or schema.load_only or schema.dump_only:
+        raise ValueError('Schemas with many/only/exclude/partial/load_only/dump_only options can\'t be compiled')
+    if schema.unknown not in (RAISE, EXCLUDE):
+        raise ValueError(f'unknown={schema.unknown!r} can\'t be compiled')
+
+    for name, field in schema.fields.items():
+        if type(field) not in FAST_TYPES:
+            raise ValueError(f'{name}: {type(field).__name__} fields can\'t be compiled')
+        if field.data_key not in (None, name) or field.attribute not in (None, name) or field.validators:
+            raise ValueError(f'{name}: data_key, attribute and validators can\'t be compiled')
+        if field.load_only or field.dump_only or getattr(field, 'as_string', False):
+            raise ValueError(f'{name}: load_only, dump_only and as_string can\'t be compiled')
+        if isinstance(field, fields.Float) and field.allow_nan:
+            raise ValueError(f'{name}: allow_nan can\'t be compiled')
+
+    hooks = {tag: hooks for tag, hooks in schema._hooks.items() if hooks}
+    post_load = hooks.pop('post_load', [])
+    if hooks or len(post_load) > 1 or any(many or kwargs.get('pass_original') for _, many, kwargs in post_load):
+        raise ValueError('Only a single post_load hook (without pass_many/pass_original) can be compiled')
+    return post_load
+
+
+def compile_schema(schema):
+    """ Generates specialised load/dump functions for the schema instance, see above """
+    post_load = _check_compilable(schema)
+    names = list(schema.fields)
+    n = len(names)
+    checks = ' and '.join(FAST_TYPES[type(schema.fields[name])].format(var=f'v{i}') for i, name in enumerate(names))
+    dump_checks = ' and '.join(
+        f'({FAST_TYPES[type(schema.fields[name])].format(var=f"v{i}")} or v{i} is None)' for i, name in enumerate(names)
+    )
+    result = '{' + ', '.join(f'{name!r}: v{i}' for i, name in enumerate(names)) + '}'
+    values = ', '.join(f'v{i}' for i in range(n))
+
+    if post_load:
+        # marshmallow 4 also passes unknown to the hooks
+        hook_kwargs = 'many=False, partial=_partial' + (', unknown=_unknown' if int(version('marshmallow')[0]) >= 4 else '')
+        loaded = f'_hook({result}, {hook_kwargs})'
+    else:
+        loaded = result
+
+    source = '\n'.join([
+        'def fast_load(data):',
+        # With unknown=RAISE, having exactly as many keys as fields (and finding them all) means there are no unknown keys
+        '    if type(data) is not dict' + (f' or len(data) != {n}' if schema.unknown == RAISE else '') + ':',
+        '        return _MISS',
+        '    try:',
+        f'        {values}{"," if n == 1 else ""} = ' + ', '.join(f'data[{name!r}]' for name in names),
+        '    except KeyError:',
+        '        return _MISS',
+        f'    if {checks}:',
+        f'        return {loaded}',
+        '    return _MISS',
+        '',
+        '',
+        'def fast_dump(obj):',
+        '    if type(obj) is dict:',
+        '        try:',
+        f'            {values}{"," if n == 1 else ""} = ' + ', '.join(f'obj[{name!r}]' for name in names),
+        '        except KeyError:',
+        '            return _MISS',
+        # marshmallow tries obj[key] first on anything with __getitem__, leave those to it
+        '    elif hasattr(type(obj), "__getitem__"):',
+        '        return _MISS',
+        '    else:',
+        '        try:',
+        f'            {values}{"," if n == 1 else ""} = ' + ', '.join(f'obj.{name}' for name in names),
+        '        except AttributeError:',
+        '            return _MISS',
+        f'    if {dump_checks}:',
+        f'        return {result}',
+        '    return _MISS',
+    ])
+
+    namespace = {
+        '_MISS': _MISS,
+        '_isfinite': math.isfinite,
+        '_partial': schema.partial,
+        '_unknown': schema.unknown,
+        '_hook': getattr(schema, post_load[0][0]) if post_load else None,
+    }
+    exec(source, namespace)
+    return CompiledSchema(schema, namespace['fast_load'], namespace['fast_dump'], source)
+
+
+compiled_user_schema = compile_schema(user_schema)
+compiled_user_schema.load(user)  # User object, same as user_schema.load(user)
+compiled_user_schema.dump(user_object)  # {'id_': 1, 'name': 'mike'}, same as user_schema.dump(user_object)
+
+
+# --------------- Streaming Records From Big Files ---------------
+
+# user_schema.loads(...) and json.load(f) need the whole document in memory (plus every object made from it).
+# That's fine for a small file, but a file with tens of GB of records won't fit.
+
+# stream_load reads the file a chunk at a time and yields one User (or a batch of them) per record as it goes,
+# so only the current chunk and batch are ever in memory. It understands two layouts:
+# - JSON Lines: one JSON object per line
+# - a single top level JSON array of objects: [{...}, {...}, ...]
+# The objects in an array are decoded one at a time with JSONDecoder.raw_decode, which parses one JSON value
+# starting at an index and tells us where it ended.
+
+# A bad record (invalid JSON on a line, or data the schema rejects) doesn't stop the stream: it's passed to
+# on_error(index, exception) and skipped. By default it's logged.
+# (Invalid JSON inside an array is the exception, we can't tell where the next record starts, so that raises.)
+
+import logging
+import re
+from marshmallow import ValidationError
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_array_separator = re.compile(r'[\s,]*')
+
+
+def _log_record_error(index, error):
+    logger.warning('Skipping record %d: %s', index, error)
+
+
+def _iter_json_lines(file):
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield None, e
+
+
+def _skip_whitespace(file, chunk_size):
+    """ Reads until the first non whitespace character, returns the rest of that chunk ('' for an empty file) """
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return ''
+        chunk = chunk.lstrip()
+        if chunk:
+            return chunk
+
+
+def _iter_json_array(file, buffer, chunk_size, max_record_size):
+    """ buffer is the start of the file, from the opening [ on """
+    pos = 1
+    eof = False
+
+    while True:
+        pos = _array_separator.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+            # A value running right up to the end of the buffer might be cut off (e.g. a number), so make sure
+            if end == len(buffer) and not eof:
+                raise json.JSONDecodeError('Need more data', buffer, end)
+            pos = end
+        except json.JSONDecodeError:
+            # Most likely the record is cut off at the end of the chunk, read some more and try again
+            if eof:
+                raise
+            if len(buffer) - pos > max_record_size:
+                raise ValueError(f'Record at offset {pos} is bigger than max_record_size={max_record_size}')
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield record, None
+
+
+def stream_load(schema, file_name, batch_size=None, on_error=_log_record_error, chunk_size=1 << 20,
+                max_record_size=16 << 20, encoding='utf-8'):
+    """ Yields schema.load(record) for every record in a JSON Lines or JSON array file, or lists of batch_size of them
+
+    schema can be a Schema or a CompiledSchema (see compile_schema above).
+    """
+    batch = []
+
+    # JSON is UTF-8, don't fall back on the locale's encoding like open() does by default
+    with open(file_name, encoding=encoding) as file:
+        # The first non whitespace character tells the two layouts apart
+        start = _skip_whitespace(file, chunk_size)
+        if start[:1] == '[':
+            records = _iter_json_array(file, start, chunk_size, max_record_size)
+        elif start[:1] in ('{', ''):
+            file.seek(0)
+            records = _iter_json_lines(file)
+        else:
+            raise ValueError(f'Expected {file_name} to hold a JSON array or JSON Lines, but it starts with {start[:1]!r}')
+
+        for index, (record, error) in enumerate(records):
+            if error is None:
+                try:
+                    loaded = schema.load(record)
+                except ValidationError as e:
+                    error = e
+
+            if error is not None:
+                on_error(index, error)
+                continue
+
+            if batch_size is None:
+                yield loaded
+            else:
+                batch.append(loaded)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+
+    if batch:
+        yield batch
+
+# e.g.
+# for users in stream_load(compiled_user_schema, 'users.jsonl', batch_size=1000):
+#     ...
+
+
+# --------------- Compact Binary Records ---------------
+
+# JSON spells out every key name in every record, turns numbers into text and back, and has to be parsed in full
+# before we can look at a single field. For fixed shape records like User we can do much better with a binary layout
+# built from the schema's field types, using the struct module:
+# - Int fields are 8 byte integers, Float fields 8 byte doubles, Bool fields 1 byte
+# - Str fields are UTF-8 bytes, with their lengths stored up front
+# - a bitmap marks the fields that are None
+
+# One record:  [null bitmap][fixed width fields][length of each string][string bytes...]
+# A batch:     [record count][offset of each record, plus the end][records...]
+
+# Decoding doesn't build anything up front. decode/decode_many return views over the buffer (memoryviews, no copies),
+# and a field is only unpacked when it's accessed. That's a big win when a consumer only looks at a couple of fields.
+
+import itertools
+import struct
+
+FIXED_FORMATS = {
+    fields.Integer: 'q',
+    fields.Float: 'd',
+    fields.Boolean: '?',
+}
+
+BATCH_HEADER = struct.Struct('<Q')
+OFFSET = struct.Struct('<Q')
+
+
+class _FixedField:
+    def __init__(self, bit, offset, fmt):
+        self.bit = bit
+        self.offset = offset
+        self.fmt = struct.Struct('<' + fmt)
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        if view._buffer[view._start + self.bit // 8] & (1 << self.bit % 8):
+            return None
+        return self.fmt.unpack_from(view._buffer, view._start + self.offset)[0]
+
+
+class _StringField:
+    def __init__(self, bit, index):
+        self.bit = bit
+        self.index = index
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        if view._buffer[view._start + self.bit // 8] & (1 << self.bit % 8):
+            return None
+        start, end = view._string_bounds(self.index)
+        return str(view._buffer[start:end], 'utf-8')
+
+
+class RecordView:
+    """ Lazily decoded record, the fields are class level descriptors generated by BinaryCodec """
+    __slots__ = ('_buffer', '_start', '_lengths')
+
+    _names = ()
+    _codec = None
+
+    def __init__(self, buffer, start):
+        self._buffer = buffer
+        self._start = start
+        self._lengths = None
+
+    def _string_bounds(self, index):
+        codec = self._codec
+        if self._lengths is None:
+            self._lengths = codec.lengths.unpack_from(self._buffer, self._start + codec.fixed.size)
+        start = self._start + codec.fixed.size + codec.lengths.size + sum(self._lengths[:index])
+        return start, start + self._lengths[index]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self._names}
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.as_dict()!r})'
+
+
+class RecordBatch:
+    """ Sequence of RecordViews over a buffer made by BinaryCodec.encode_many """
+
+    def __init__(self, codec, buffer):
+        self.codec = codec
+        self.buffer = memoryview(buffer)
+        self.count = BATCH_HEADER.unpack_from(self.buffer)[0]
+        self.data_start = BATCH_HEADER.size + OFFSET.size * (self.count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('record index out of range')
+        offset = OFFSET.unpack_from(self.buffer, BATCH_HEADER.size + OFFSET.size * index)[0]
+        return self.codec.view_class(self.buffer, self.data_start + offset)
+
+    def __iter__(self):
+        return (self[i] for i in range(self.count))
+
+
+class BinaryCodec:
+    def __init__(self, schema):
+        self.schema = schema
+        fixed_names, string_names = [], []
+        fixed_format = ''
+
+        for name, field in schema.fields.items():
+            if isinstance(field, fields.String):
+                string_names.append(name)
+            elif type(field) in FIXED_FORMATS:
+                fixed_names.append(name)
+                fixed_format += FIXED_FORMATS[type(field)]
+            else:
+                raise ValueError(f'{name}: {type(field).__name__} fields aren\'t supported by the binary codec')
+
+        self.names = list(schema.fields)
+        self.fixed_names = fixed_names
+        self.string_names = string_names
+        self.bitmap_size = (len(self.names) + 7) // 8
+        self.fixed = struct.Struct(f'<{self.bitmap_size}B{fixed_format}')
+        self.lengths = struct.Struct(f'<{len(string_names)}I')
+
+        # Generate the view class: one descriptor per field, which knows where to find the field in a record
+        bits = {name: i for i, name in enumerate(self.names)}
+        attrs = {'__slots__': (), '_names': tuple(self.names), '_codec': self}
+        offset = self.bitmap_size
+        for name, fmt in zip(fixed_names, fixed_format):
+            attrs[name] = _FixedField(bits[name], offset, fmt)
+            offset += struct.calcsize('<' + fmt)
+        for index, name in enumerate(string_names):
+            attrs[name] = _StringField(bits[name], index)
+        self.view_class = type(f'{type(schema).__name__}View', (RecordView,), attrs)
+        self.encode = self._generate_encoder()
+
+    def _generate_encoder(self):
+        """ Generates encode(obj), which encodes one record (an object or a dict, like Schema.dump) """
+        variables = {name: f'v{i}' for i, name in enumerate(self.names)}
+        strings = {name: f's{i}' for i, name in enumerate(self.string_names)}
+        bitmap = [
+            ' | '.join(f'(({variables[name]} is None) << {i % 8})' for i, name in enumerate(self.names) if i // 8 == byte)
+            for byte in range(self.bitmap_size)
+        ]
+        packed = bitmap + [f'{variables[name]} or 0' for name in self.fixed_names] + [f'len({strings[name]})' for name in strings]
+
+        lines = [
+            'def encode(obj):',
+            '    if type(obj) is dict:',
+            *[f'        {variables[name]} = obj.get({name!r})' for name in self.names],
+            '    else:',
+            *[f'        {variables[name]} = getattr(obj, {name!r}, None)' for name in self.names],
+            *[f"    {strings[name]} = {variables[name]}.encode('utf-8') if {variables[name]} is not None else b''"
+              for name in strings],
+            f"    return b''.join(({', '.join(['_pack(' + ', '.join(packed) + ')'] + list(strings.values()))},))",
+        ]
+        namespace = {'_pack': struct.Struct(self.fixed.format + self.lengths.format[1:]).pack}
+        exec('\n'.join(lines), namespace)
+        return namespace['encode']
+
+    def encode_many(self, objs):
+        """ Encodes the records into one contiguous buffer """
+        records = list(map(self.encode, objs))
+        offsets = list(itertools.accumulate(map(len, records), initial=0))
+
+        return b''.join([
+            BATCH_HEADER.pack(len(records)),
+            struct.pack(f'<{len(offsets)}Q', *offsets),
+            *records,
+        ])
+
+    def decode(self, buffer):
+        return self.view_class(memoryview(buffer), 0)
+
+    def decode_many(self, buffer):
+        return RecordBatch(self, buffer)
+
+
+user_codec = BinaryCodec(user_schema)
+encoded_users = user_codec.encode_many([User(1, 'mike'), User(2, 'michael')])  # 69 bytes
+decoded_users = user_codec.decode_many(encoded_users)
+decoded_users[1].name  # 'michael', only the name field of the second record gets decoded
+
+
+# --------------- Serializing In Parallel ---------------
+
+# Serialization is CPU bound, so on one core millions of records take minutes. Like in multi-processing.py,
+# we can split the records into chunks and serialize each chunk in a ProcessPoolExecutor worker.
+
+# The catch is that records have to be pickled to get to the workers, and the results pickled to get back.
+# So each worker returns one JSON string per chunk (cheap to send back) that we just glue together in order,
+# and the chunk size is picked from a quick timing of a small sample:
+# - big enough that each task does ~target_seconds of work, so the per task overhead doesn't matter
+# - small enough that every worker gets a few chunks to balance the load
+# - and if the whole job would only take a moment, it's done right here without a pool at all
+
+# Workers are handed the schema class, and build (and compile, when possible) their own schema once.
+
+import concurrent.futures
+import os
+import time
+
+_worker_schemas = {}
+
+
+def _worker_schema(schema_class):
+    schema = _worker_schemas.get(schema_class)
+    if schema is None:
+        schema = schema_class()
+        try:
+            schema = compile_schema(schema)
+        except ValueError:
+            pass  # Options the compiler doesn't handle, the schema itself works too
+        _worker_schemas[schema_class] = schema
+    return schema
+
+
+def _dump_chunk(schema_class, objs, json_lines):
+    """ Runs in a worker: returns the chunk as JSON array items, or JSON lines, without the surrounding brackets """
+    schema = _worker_schema(schema_class)
+    dumps = schema.schema.opts.render_module.dumps if isinstance(schema, CompiledSchema) else schema.opts.render_module.dumps
+    dumped = schema.dump_many(objs) if isinstance(schema, CompiledSchema) else schema.dump(objs, many=True)
+    return ('\n' if json_lines else ', ').join(dumps(item) for item in dumped)
+
+
+def _load_chunk(schema_class, lines):
+    """ Runs in a worker: loads a chunk of JSON lines """
+    schema = _worker_schema(schema_class)
+    data = [json.loads(line) for line in lines]
+    return schema.load_many(data) if isinstance(schema, CompiledSchema) else schema.load(data, many=True)
+
+
+def _chunk_size(func, schema_class, items, workers, target_seconds, sample_size=500):
+    """ Times func on a small sample and returns a chunk size, or None if it's not worth using a pool """
+    sample = items[:sample_size]
+    started = time.perf_counter()
+    func(schema_class, sample, *([False] if func is _dump_chunk else []))
+    per_item = (time.perf_counter() - started) / max(len(sample), 1)
+
+    if per_item * len(items) < target_seconds * workers:
+        return None
+
+    per_task = max(int(target_seconds / per_item), sample_size)
+    balanced = -(-len(items) // (workers * 4))  # ceil, so every worker gets about 4 chunks
+    return min(per_task, balanced)
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parallel_dump_many(schema_class, objs, workers=None, json_lines=False, target_seconds=0.05):
+    """ Same output as schema_class().dumps(objs, many=True) (or JSON Lines), serialized across worker processes """
+    objs = list(objs)
+    workers = workers or os.cpu_count() or 1
+    size = _chunk_size(_dump_chunk, schema_class, objs, workers, target_seconds)
+
+    if size is None:
+        parts = [_dump_chunk(schema_class, objs, json_lines)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = _chunks(objs, size)
+            # map hands the results back in the order of the chunks
+            parts = list(executor.map(_dump_chunk, [schema_class] * len(chunks), chunks, [json_lines] * len(chunks)))
+
+    if json_lines:
+        return '\n'.join(parts)
+    return '[' + ', '.join(part for part in parts if part) + ']'
+
+
+def parallel_load_many(schema_class, lines, workers=None, target_seconds=0.05):
+    """ Loads a list of JSON lines (one record each) across worker processes, returns the loaded objects in order """
+    lines = list(lines)
+    workers = workers or os.cpu_count() or 1
+    size = _chunk_size(_load_chunk, schema_class, lines, workers, target_seconds)
+
+    if size is None:
+        return _load_chunk(schema_class, lines)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = _chunks(lines, size)
+        results = []
+        for loaded in executor.map(_load_chunk, [schema_class] * len(chunks), chunks):
+            results.extend(loaded)
+        return results
+
+
+# --------------- Memory Lean Users ---------------
+
+# Every User made by load_user carries its own __dict__, which is most of the memory a User takes.
+# When a job holds millions of them, memory runs out long before CPU does. Some leaner options:
+
+# 1. __slots__: the attributes live in fixed slots on the object, no dict
+class SlottedUser:
+    __slots__ = ('id_', 'name')
+
+    def __init__(self, id_: int, name: str):
+        self.id_ = id_
+        self.name = name
+
+
+# 2. A namedtuple: a plain tuple with named fields, even smaller, but immutable
+import collections
+
+UserRecord = collections.namedtuple('UserRecord', ['id_', 'name'])
+
+
+class SlottedUserSchema(UserSchema):
+    @post_load
+    def load_user(self, data, **kwargs):
+        return SlottedUser(**data)
+
+
+class UserRecordSchema(UserSchema):
+    @post_load
+    def load_user(self, data, **kwargs):
+        return UserRecord(**data)
+
+
+# 3. For streaming consumers that handle one record at a time and then drop it, we don't need a new object per record.
+# ReusableUserSchema hands out the same SlottedUser every time, refilled with the new record's values (a flyweight).
+# That means a loaded user is only valid until the next load: don't keep references to it, copy what you need.
+# Loading many at once would give a list of the same user N times, all holding the last record, so that raises.
+class ReusableUserSchema(UserSchema):
+    reuses_instance = True  # CompiledSchema.load_many checks this too
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.many:
+            raise ValueError('ReusableUserSchema hands out the same user every time, it can\'t load many')
+        self.user = SlottedUser(0, '')
+
+    def load(self, data, *, many=None, **kwargs):
+        if many:
+            raise ValueError('ReusableUserSchema hands out the same user every time, it can\'t load many')
+        return super().load(data, many=many, **kwargs)
+
+    @post_load
+    def load_user(self, data, **kwargs):
+        user = self.user
+        user.id_ = data['id_']
+        user.name = data['name']
+        return user
+
+
+# 4. In between: a pool of instances. acquire() reuses a released user when there is one,
+# so a consumer that processes records in small batches (and releases them afterwards) stops allocating users.
+class UserPool:
+    def __init__(self, max_size=1024):
+        self.free = []
+        self.free_set = set(self.free)  # The same users, to catch a user being released twice (hashed by identity)
+        self.max_size = max_size
+
+    def acquire(self, id_, name):
+        if self.free:
+            user = self.free.pop()
+            self.free_set.discard(user)
+            user.id_ = id_
+            user.name = name
+            return user
+        return SlottedUser(id_, name)
+
+    def release(self, user):
+        # Releasing twice would put the user in free twice, and then hand the same user out to two callers
+        if user in self.free_set:
+            raise ValueError(f'{user!r} was already released')
+        if len(self.free) < self.max_size:
+            self.free.append(user)
+            self.free_set.add(user)
+
+
+class PooledUserSchema(UserSchema):
+    def __init__(self, *args, pool=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool or UserPool()
+
+    @post_load
+    def load_user(self, data, **kwargs):
+        return self.pool.acquire(**data)
+
+
+# Compare the memory each model keeps alive per record, and the cost of streaming records through each one
+import sys
+import tracemalloc
+
+
+def benchmark_user_models(count=100_000):
+    records = [{'id_': i, 'name': f'user-{i}'} for i in range(count)]
+
+    for schema in [UserSchema(), SlottedUserSchema(), UserRecordSchema()]:
+        tracemalloc.start()
+        users = [schema.load(record) for record in records]
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{type(schema).__name__:>20}: {held / count:.0f} bytes held per record')
+        del users
+
+    # Streaming: load each record and drop it straight away, so nothing is held and what counts is
+    # how many memory blocks loading one record allocates (and keeps while the record is in use), and the time it takes.
+    # sys.getallocatedblocks() is measured separately from the timing, calling it costs more than the load itself.
+    # The pool and the flyweight get the allocations per record down to zero. Whether that saves time depends on
+    # the allocator: CPython's is fast for small objects, so the pool's own bookkeeping can cost more than it saves,
+    # while fewer allocations still means less memory churn and fewer garbage collector runs.
+    for schema in [UserSchema(), SlottedUserSchema(), PooledUserSchema(), ReusableUserSchema()]:
+        compiled = compile_schema(schema)
+        pool = getattr(schema, 'pool', None)
+
+        started = time.perf_counter()
+        for record in records:
+            user = compiled.load(record)
+            if pool is not None:
+                pool.release(user)
+        elapsed = time.perf_counter() - started
+
+        blocks = 0
+        for record in records:
+            before = sys.getallocatedblocks()
+            user = compiled.load(record)
+            blocks += sys.getallocatedblocks() - before
+            if pool is not None:
+                pool.release(user)
+            del user  # Free it before the next measurement, not halfway through it
+
+        print(f'{type(schema).__name__:>20}: {elapsed / count * 1e9:.0f} ns and {blocks / count:.1f} blocks allocated'
+              f' per streamed record')
+
+
+# --------------- Serialization Benchmarks ---------------
+
+# Which of the options above is fastest depends on the payload: marshmallow vs plain json vs the compiled schema vs
+# the binary codec, one small record vs one big one vs nested records vs many records at once.
+# run_serialization_benchmarks times each option on each payload and reports:
+# - throughput (records per second)
+# - latency percentiles per call (p50, p90, p99)
+# - peak memory allocated during a call
+# The results can be saved as JSON and compared against a previous run, to catch regressions.
+
+import datetime
+import platform
+import statistics
+
+
+class UserWithFriends:
+    def __init__(self, id_: int, name: str, friends: list):
+        self.id_ = id_
+        self.name = name
+        self.friends = friends
+
+
+class UserWithFriendsSchema(Schema):
+    id_ = fields.Int()
+    name = fields.Str()
+    friends = fields.List(fields.Nested(UserSchema))
+
+    @post_load
+    def load_user(self, data, **kwargs):
+        return UserWithFriends(**data)
+
+
+def make_users(count, name_size=8):
+    return [User(i, f'user-{i}'.ljust(name_size, 'x')) for i in range(count)]
+
+
+def benchmark_payloads():
+    """ name -> (schema, objects, many) """
+    return {
+        'small': (UserSchema(), make_users(1)[0], False),
+        'large': (UserSchema(), make_users(1, name_size=10_000)[0], False),
+        'nested': (UserWithFriendsSchema(), UserWithFriends(1, 'mike', make_users(50)), False),
+        'many': (UserSchema(), make_users(1000), True),
+    }
+
+
+def _as_dict(obj):
+    """ json.dumps(obj.__dict__) style, recursing into lists of objects for the nested payload """
+    d = dict(obj.__dict__)
+    for key, value in d.items():
+        if isinstance(value, list):
+            d[key] = [_as_dict(item) for item in value]
+    return d
+
+
+def benchmark_operations(schema, objs, many):
+    """ name -> (function to time, number of records it handles). Options that don't support the payload are left out """
+    count = len(objs) if many else 1
+    dumped = schema.dump(objs, many=many)
+    dumped_json = schema.dumps(objs, many=many)
+
+    operations = {
+        'marshmallow.dump': (lambda: schema.dump(objs, many=many), count),
+        'marshmallow.dumps': (lambda: schema.dumps(objs, many=many), count),
+        'marshmallow.load': (lambda: schema.load(dumped, many=many), count),
+        'marshmallow.loads': (lambda: schema.loads(dumped_json, many=many), count),
+        'json.dumps(__dict__)': (
+            (lambda: json.dumps([_as_dict(obj) for obj in objs])) if many else (lambda: json.dumps(_as_dict(objs))), count
+        ),
+        'json.loads': (lambda: json.loads(dumped_json), count),
+    }
+
+    try:
+        compiled = compile_schema(schema)
+    except ValueError:
+        compiled = None
+    if compiled is not None:
+        operations.update({
+            'compiled.dump': (lambda: compiled.dump_many(objs) if many else compiled.dump(objs), count),
+            'compiled.dumps': (lambda: compiled.dumps(objs, many=many), count),
+            'compiled.load': (lambda: compiled.load_many(dumped) if many else compiled.load(dumped), count),
+            'compiled.loads': (lambda: compiled.loads(dumped_json, many=many), count),
+        })
+
+    try:
+        codec = BinaryCodec(schema)
+    except ValueError:
+        codec = None
+    if codec is not None:
+        encoded = codec.encode_many(objs) if many else codec.encode(objs)
+        operations.update({
+            'binary.encode': (lambda: codec.encode_many(objs) if many else codec.encode(objs), count),
+            # Decoding is lazy, so also read every field to make it a fair comparison
+            'binary.decode': (
+                (lambda: [view.as_dict() for view in codec.decode_many(encoded)]) if many
+                else (lambda: codec.decode(encoded).as_dict()),
+                count,
+            ),
+        })
+    return operations
+
+
+def _measure(func, records, min_time=0.2, min_calls=20):
+    # Warm up, then time individual calls until we've spent min_time
+    func()
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_calls or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    percentiles = statistics.quantiles(timings, n=100)
+    return {
+        'records_per_second': records * len(timings) / sum(timings),
+        'p50_us': percentiles[49] * 1e6,
+        'p90_us': percentiles[89] * 1e6,
+        'p99_us': percentiles[98] * 1e6,
+        'peak_memory_bytes': peak,
+        'calls': len(timings),
+    }
+
+
+def compare_benchmark_results(old, new, threshold=0.1):
+    """ Returns a list of (benchmark, old p50, new p50) for everything that got more than threshold slower """
+    regressions = []
+    for key, result in new['results'].items():
+        previous = old['results'].get(key)
+        if previous is not None and result['p50_us'] > previous['p50_us'] * (1 + threshold):
+            regressions.append((key, previous['p50_us'], result['p50_us']))
+    return regressions
+
+
+def run_serialization_benchmarks(save_to=None, compare_to=None, min_time=0.2):
+    results = {}
+    for payload, (schema, objs, many) in benchmark_payloads().items():
+        for operation, (func, records) in benchmark_operations(schema, objs, many).items():
+            result = results[f'{payload}/{operation}'] = _measure(func, records, min_time)
+            print(f"{payload + '/' + operation:>34}: {result['records_per_second']:>12,.0f} records/s  "
+                  f"p50 {result['p50_us']:>9.1f}us  p99 {result['p99_us']:>9.1f}us  "
+                  f"peak {result['peak_memory_bytes']:>10,} bytes")
+
+    run = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'marshmallow': version('marshmallow'),
+        },
+        'results': results,
+    }
+
+    if compare_to is not None and os.path.exists(compare_to):
+        with open(compare_to) as f:
+            for key, old_p50, new_p50 in compare_benchmark_results(json.load(f), run):
+                print(f'REGRESSION {key}: p50 {old_p50:.1f}us -> {new_p50:.1f}us')
+
+    if save_to is not None:
+        with open(save_to, 'w') as f:
+            json.dump(run, f, indent=2)
+    return run
+
+
+if __name__ == '__main__':
+    users = [User(i, f'user-{i}') for i in range(200_000)]
+    users_json = parallel_dump_many(UserSchema, users)
+    assert users_json == user_schema.dumps(users, many=True)
+
+    users_loaded = parallel_load_many(UserSchema, parallel_dump_many(UserSchema, users, json_lines=True).splitlines())
+    assert len(users_loaded) == len(users)
+
+    benchmark_user_models()
+
+    # Compares against the results of the previous run, then saves this run's results for the next one
+    run_serialization_benchmarks(save_to='serialization-benchmarks.json', compare_to='serialization-benchmarks.json')